@@ -0,0 +1,95 @@
+import copy
+
+import pytest
+
+"""
+Configuração compartilhada do pytest
+
+Fornece os dados de exemplo da API Sales Builder como fixtures; cada teste
+recebe sua própria cópia da resposta de exemplo. Testes marcados com @pytest.mark.network (como o envio real de
+test_specific_number.py) fazem chamadas a serviços externos e só são executados
+quando a opção --run-network é informada.
+"""
+
+# Exemplo de resposta da API Sales Builder
+_SAMPLE_RESPONSE = {
+    "task_id": "1741882913572_8470f029",
+    "queue": "sales-builder",
+    "state": "COMPLETED",
+    "result": {
+        "analise_icp": None,
+        "atendimento": {
+            "interacao": "Iniciar a conversa com lead à partir do P1",
+            "status": "primeiro_contato",
+            "p_atual": "P1",
+            "tipo_interacao": "positivo",
+            "p_proxima": "P2",
+            "msg_resposta": [
+                "Oi Guilherme, tudo bem? Aqui é o Vagner Campos da Arduus! Vi suas discussões interessantes sobre liderança em tecnologia no LinkedIn",
+                "Percebi que temos visões alinhadas sobre como a inovação pode transformar ciclos de trabalho. Gostaria de saber mais sobre seus objetivos com IA?"
+            ],
+            "periodo_agendamento": "NULL",
+            "horario_agendamento": "NULL",
+            "dia_agendamento": "NULL",
+            "link_agendamento_google_calendar": "NULL",
+            "link_meet_google": "NULL"
+        },
+        "msg_resposta": [
+            "Oi Guilherme, tudo bem? Aqui é o Vagner Campos da Arduus! Vi suas discussões interessantes sobre liderança em tecnologia no LinkedIn",
+            "Percebi que temos visões alinhadas sobre como a inovação pode transformar ciclos de trabalho. Gostaria de saber mais sobre seus objetivos com IA?"
+        ],
+        "nome_prospect": "Guilherme Moura",
+        "whatsapp_prospect": "5524999887888"
+    },
+    "timestamp": "2025-03-13T16:30:17.336866+00:00"
+}
+
+# Mensagens de fallback esperadas quando a API retorna uma lista vazia
+_FALLBACK_MESSAGES = (
+    "Oi, tudo bem? Aqui é o Vagner Campos, fundador da Arduus. Vi seu interesse em inovação e transformação digital no LinkedIn, especialmente na área de IA.",
+    "Percebi que você entrou em contato conosco para conhecer mais sobre nossas soluções de IA generativa. Gostaria de saber mais sobre como podemos impulsionar sua transformação digital?"
+)
+
+@pytest.fixture
+def sample_response():
+    """
+    Resposta de exemplo da API Sales Builder
+    
+    Returns:
+        dict: Cópia profunda da resposta, própria de cada teste; o código testado
+              pode alterá-la (inclusive o dict aninhado "result") sem afetar os demais
+    """
+    return copy.deepcopy(_SAMPLE_RESPONSE)
+
+@pytest.fixture(scope="session")
+def fallback_messages():
+    """
+    Mensagens de fallback enviadas quando a task retorna 200 sem mensagens
+    
+    Returns:
+        tuple: As duas mensagens padrão, na ordem de envio
+    """
+    return _FALLBACK_MESSAGES
+
+def pytest_addoption(parser):
+    """Registra a opção --run-network"""
+    parser.addoption(
+        "--run-network",
+        action="store_true",
+        default=False,
+        help="Executa os testes que acessam serviços externos"
+    )
+
+def pytest_configure(config):
+    """Registra o marcador network"""
+    config.addinivalue_line("markers", "network: teste que faz chamadas reais a serviços externos")
+
+def pytest_collection_modifyitems(config, items):
+    """Pula os testes marcados com network, a menos que --run-network seja informado"""
+    if config.getoption("--run-network"):
+        return
+    
+    skip_network = pytest.mark.skip(reason="Teste de rede; use --run-network para executar")
+    for item in items:
+        if "network" in item.keywords:
+            item.add_marker(skip_network)
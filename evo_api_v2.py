@@ -1,17 +1,28 @@
 import json
+import asyncio
 import requests
+import httpx
 import os
 import base64
 import logging
 from dotenv import load_dotenv
 from openai import OpenAI, OpenAIError
 from pydub import AudioSegment
-from datetime import datetime, timedelta
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Status HTTP que disparam nova tentativa de envio (mesmos da sessão requests)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
 class EvolutionAPI:
+    """
+    Cliente da Evolution API para envio de mensagens pelo WhatsApp.
+    
+    Todas as requisições passam por uma sessão HTTP com pool de conexões, então
+    uma instância deve ser criada uma vez e reutilizada durante a vida do processo;
+    em scripts e testes, use `with EvolutionAPI() as api:` para fechá-la ao final.
+    """
     def __init__(self, settings=None):
         """
         Inicializa a API de Evolução com configurações.
@@ -31,8 +42,7 @@ class EvolutionAPI:
             self.evo_instance = settings.EVO_INSTANCE
             self.evo_token = settings.EVO_TOKEN
         else:
-            # Carregar das variáveis de ambiente
-            load_dotenv()  # Garantir que as variáveis de ambiente sejam carregadas
+            # Carregar das variáveis de ambiente (o .env já foi carregado na importação do módulo)
             self.evo_subdomain = os.getenv("EVO_SUBDOMAIN")
             self.evo_instance = os.getenv("EVO_INSTANCE")
             self.evo_token = os.getenv("EVO_TOKEN")
@@ -66,6 +76,61 @@ class EvolutionAPI:
         }
         if self.evo_token:
             self.headers["apikey"] = self.evo_token
+        
+        # Sessão HTTP reutilizada entre os envios, com pool de conexões e sem retry:
+        # os envios não são idempotentes, e um 5xx depois da entrega duplicaria a mensagem
+        self._retry = requests.adapters.Retry(
+            total=3,  # número total de tentativas
+            backoff_factor=1,  # fator de espera entre tentativas
+            status_forcelist=list(RETRY_STATUS_CODES),  # códigos de status para retry
+            allowed_methods=["POST"],  # métodos permitidos para retry
+        )
+        self._session = requests.Session()
+        self._session.mount(
+            "https://",
+            requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=50)
+        )
+        # Apenas o sendText mantém o retry (o prefixo mais longo prevalece na sessão)
+        if self.evo_subdomain:
+            self._session.mount(
+                f"https://{self.evo_subdomain}/message/sendText/",
+                requests.adapters.HTTPAdapter(max_retries=self._retry, pool_connections=20, pool_maxsize=50)
+            )
+        
+        # Cliente HTTP assíncrono, criado no primeiro envio assíncrono
+        self._http = None
+
+
+    def close(self):
+        """Fecha a sessão HTTP."""
+        self._session.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    async def aclose(self):
+        """Fecha o cliente HTTP assíncrono e a sessão HTTP."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self.close()
+
+
+    def _get_http(self):
+        """Retorna o cliente HTTP assíncrono persistente, criando-o se necessário."""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=60,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            )
+        return self._http
 
 
     def estimate_typing_time(self, text, typing_speed=41.4):
@@ -86,7 +151,7 @@ class EvolutionAPI:
             payload[key] = value
         
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -99,113 +164,141 @@ class EvolutionAPI:
     def send_text_message(self, number, text, **kwargs):
         url = f"https://{self.evo_subdomain}/message/sendText/{self.evo_instance}"
         
-        # Log no console
-        print(f"[{datetime.now().isoformat()}] EVOLUTION API - PREPARANDO MENSAGEM: Para {number}")
-        
         # Verificar se a API está configurada
         if not self.is_configured:
             error_msg = "Evolution API não está configurada corretamente. Não é possível enviar mensagens."
             logging.error(error_msg)
-            print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: Configuração incompleta")
             return {"status": "error", "message": error_msg}
         
-        # Calcular o tempo de digitação
-        typing_time = self.estimate_typing_time(text, typing_speed=207)
-        
-        payload = {
-            "number": number,
-            "text": text,
-            "delay": typing_time
-        }
-        
-        # Adicionar opções adicionais
-        for key, value in kwargs.items():
-            payload[key] = value
-        
-        # Configurar sessão com retry para problemas de SSL
-        retry_strategy = requests.adapters.Retry(
-            total=3,  # número total de tentativas
-            backoff_factor=1,  # fator de espera entre tentativas
-            status_forcelist=[429, 500, 502, 503, 504],  # códigos de status para retry
-            allowed_methods=["POST"],  # métodos permitidos para retry
-        )
-        
-        # Criar sessão com timeout maior e configuração de retry
-        session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-        session.mount("https://", adapter)
+        payload = self._build_text_payload(number, text, **kwargs)
         
         try:
-            # Log no console antes de enviar
-            print(f"[{datetime.now().isoformat()}] EVOLUTION API - ENVIANDO: Mensagem para {number} (tempo de digitação: {typing_time}ms)")
-            
             logging.info(f"[EVO_API] Enviando mensagem para {number}: '{text[:50]}...'")
             logging.debug(f"[EVO_API] URL: {url}, Payload: {json.dumps(payload)[:200]}...")
             
             # Usar a sessão com retry e timeout maior
-            response = session.post(
+            response = self._session.post(
                 url, 
                 json=payload, 
                 headers=self.headers, 
                 timeout=60  # aumentar timeout para 60 segundos
             )
             
-            # Tratar status 200 e 201 como sucesso (201 = Created)
-            if response.status_code in [200, 201]:
-                # Log no console após enviar com sucesso
-                print(f"[{datetime.now().isoformat()}] EVOLUTION API - ENVIADO: Status {response.status_code} para {number}")
-                
-                logging.info(f"[EVO_API] Mensagem enviada com sucesso para {number}. Status: {response.status_code}")
-                try:
-                    response_data = response.json()
-                    logging.debug(f"[EVO_API] Resposta: {json.dumps(response_data)[:200]}...")
-                    
-                    # Verificar se a resposta contém algum indicador de erro
-                    if isinstance(response_data, dict) and response_data.get("error"):
-                        error_msg = response_data.get("error", {}).get("message", "Erro desconhecido na resposta")
-                        logging.error(f"[EVO_API] Erro na resposta: {error_msg}")
-                        print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
-                        return {"status": "error", "message": error_msg}
-                    
-                    return response_data
-                except ValueError:
-                    # Se não conseguir parsear JSON, retorna um dicionário com a resposta em texto
-                    logging.warning(f"[EVO_API] Resposta não é um JSON válido: {response.text[:200]}...")
-                    return {"status": "success", "raw_response": response.text[:200]}
-            else:
-                error_msg = f"Falha ao enviar mensagem. Status: {response.status_code}, Resposta: {response.text[:200]}"
-                logging.error(f"[EVO_API] {error_msg}")
-                print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: Resposta com status {response.status_code}")
-                # Não chamar raise_for_status() aqui para evitar exceção
-                return {"status": "error", "status_code": response.status_code, "message": error_msg}
+            return self._handle_text_response(number, response)
         except requests.exceptions.Timeout:
             error_msg = f"Timeout ao enviar mensagem para {number} após 60 segundos"
             logging.error(f"[EVO_API] {error_msg}")
-            print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
             return {"status": "error", "message": error_msg}
         except requests.exceptions.SSLError as e:
             error_msg = f"Erro SSL ao enviar mensagem para {number}: {str(e)}"
             logging.error(f"[EVO_API] {error_msg}")
-            print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
             return {"status": "error", "message": error_msg}
         except requests.exceptions.ConnectionError as e:
             error_msg = f"Erro de conexão ao enviar mensagem para {number}: {str(e)}"
             logging.error(f"[EVO_API] {error_msg}")
-            print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
             return {"status": "error", "message": error_msg}
         except requests.exceptions.RequestException as e:
             error_msg = f"Erro na requisição ao enviar mensagem para {number}: {str(e)}"
             logging.error(f"[EVO_API] {error_msg}")
-            print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
             return {"status": "error", "message": error_msg}
         except Exception as e:
             error_msg = f"Erro inesperado ao enviar mensagem para {number}: {str(e)}"
             logging.error(f"[EVO_API] {error_msg}")
-            print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
             return {"status": "error", "message": error_msg}
-        finally:
-            # Fechar a sessão
-            session.close()
+
+
+    def _build_text_payload(self, number, text, **kwargs):
+        """Monta o payload de sendText, com o tempo de digitação estimado e as opções adicionais."""
+        # Calcular o tempo de digitação
+        typing_time = self.estimate_typing_time(text, typing_speed=207)
+        logging.debug(f"[EVO_API] Tempo de digitação para {number}: {typing_time}ms")
+        
+        payload = {
+            "number": number,
+            "text": text,
+            "delay": typing_time
+        }
+        
+        # Adicionar opções adicionais
+        for key, value in kwargs.items():
+            payload[key] = value
+        return payload
+
+
+    def _handle_text_response(self, number, response):
+        """
+        Interpreta a resposta de sendText (requests.Response ou httpx.Response).
+        
+        Returns:
+            dict: Dados da resposta em caso de sucesso ou dicionário com status "error"
+        """
+        # Tratar status 200 e 201 como sucesso (201 = Created)
+        if response.status_code in [200, 201]:
+            logging.info(f"[EVO_API] Mensagem enviada com sucesso para {number}. Status: {response.status_code}")
+            try:
+                response_data = response.json()
+                logging.debug(f"[EVO_API] Resposta: {json.dumps(response_data)[:200]}...")
+                
+                # Verificar se a resposta contém algum indicador de erro
+                if isinstance(response_data, dict) and response_data.get("error"):
+                    error_msg = response_data.get("error", {}).get("message", "Erro desconhecido na resposta")
+                    logging.error(f"[EVO_API] Erro na resposta: {error_msg}")
+                    return {"status": "error", "message": error_msg}
+                
+                return response_data
+            except ValueError:
+                # Se não conseguir parsear JSON, retorna um dicionário com a resposta em texto
+                logging.warning(f"[EVO_API] Resposta não é um JSON válido: {response.text[:200]}...")
+                return {"status": "success", "raw_response": response.text[:200]}
+        else:
+            error_msg = f"Falha ao enviar mensagem. Status: {response.status_code}, Resposta: {response.text[:200]}"
+            logging.error(f"[EVO_API] {error_msg}")
+            # Não chamar raise_for_status() aqui para evitar exceção
+            return {"status": "error", "status_code": response.status_code, "message": error_msg}
+
+
+    async def send_text_message_async(self, number, text, **kwargs):
+        """
+        Versão assíncrona de send_text_message.
+        
+        Usa um httpx.AsyncClient persistente, sem bloquear o event loop, e repete
+        o envio em caso de falha de conexão ou status 429/5xx, como a sessão síncrona.
+        """
+        url = f"https://{self.evo_subdomain}/message/sendText/{self.evo_instance}"
+        
+        # Verificar se a API está configurada
+        if not self.is_configured:
+            error_msg = "Evolution API não está configurada corretamente. Não é possível enviar mensagens."
+            logging.error(error_msg)
+            return {"status": "error", "message": error_msg}
+        
+        payload = self._build_text_payload(number, text, **kwargs)
+        logging.info(f"[EVO_API] Enviando mensagem para {number}: '{text[:50]}...'")
+        
+        max_retries = self._retry.total
+        for attempt in range(max_retries + 1):
+            try:
+                response = await self._get_http().post(url, json=payload)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                    return self._handle_text_response(number, response)
+                logging.warning(f"[EVO_API] Status {response.status_code} ao enviar para {number}. Tentando novamente...")
+            except httpx.TimeoutException:
+                if attempt == max_retries:
+                    error_msg = f"Timeout ao enviar mensagem para {number} após 60 segundos"
+                    logging.error(f"[EVO_API] {error_msg}")
+                    return {"status": "error", "message": error_msg}
+            except httpx.TransportError as e:
+                if attempt == max_retries:
+                    error_msg = f"Erro de conexão ao enviar mensagem para {number}: {str(e)}"
+                    logging.error(f"[EVO_API] {error_msg}")
+                    return {"status": "error", "message": error_msg}
+            except Exception as e:
+                error_msg = f"Erro inesperado ao enviar mensagem para {number}: {str(e)}"
+                logging.error(f"[EVO_API] {error_msg}")
+                return {"status": "error", "message": error_msg}
+            
+            # Espera exponencial entre tentativas, como o backoff da sessão síncrona
+            await asyncio.sleep(self._retry.backoff_factor * (2 ** attempt))
 
 
     def send_status_message(self, type_content, content, **kwargs):
@@ -220,7 +313,7 @@ class EvolutionAPI:
             payload[key] = value
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -243,7 +336,7 @@ class EvolutionAPI:
             payload[key] = value
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -266,7 +359,7 @@ class EvolutionAPI:
             payload[key] = value
             
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -286,7 +379,7 @@ class EvolutionAPI:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -311,7 +404,7 @@ class EvolutionAPI:
             payload[key] = value
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -330,7 +423,7 @@ class EvolutionAPI:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -355,7 +448,7 @@ class EvolutionAPI:
         }
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -380,7 +473,7 @@ class EvolutionAPI:
             payload[key] = value
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -405,7 +498,7 @@ class EvolutionAPI:
             payload[key] = value
 
         try:
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = self._session.post(url, json=payload, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} com dados {payload} retornou status {response.status_code}")
@@ -420,7 +513,7 @@ class EvolutionAPI:
         headers = {"apikey": self.evo_token}
         
         try:
-            response = requests.get(url, headers=headers)
+            response = self._session.get(url, headers=headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} retornou status {response.status_code}")
@@ -441,7 +534,7 @@ class EvolutionAPI:
         url = f"https://{self.evo_subdomain}/group/fetchAllGroups/{self.evo_instance}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._session.get(url, headers=self.headers)
             response.raise_for_status()
             if response.status_code == 200:
                 logging.info(f"Requisição para {url} retornou status {response.status_code}")
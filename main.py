@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, status, Depends, Request
+from fastapi import FastAPI, HTTPException, status, Depends, Header, Request
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
 from pydantic_settings import BaseSettings
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -9,11 +9,11 @@ from fastapi.middleware.cors import CORSMiddleware
 import structlog
 from datetime import datetime, timedelta
 import re
+import hmac
 import httpx
 import asyncio
 from functools import partial
 from dotenv import load_dotenv
-import json
 from bson.objectid import ObjectId
 
 """
@@ -48,6 +48,11 @@ class Settings(BaseSettings):
     # Configurações do Sales Builder
     SALES_BUILDER_API_KEY: Optional[str] = Field(default=None, env="SALES_BUILDER_API_KEY")
     SALES_BUILDER_API_URL: str = "https://sales-builder.ornexus.com/kickoff"
+    # URL pública de /webhooks/sales-builder e segredo que o Sales Builder envia no header
+    # X-Webhook-Secret; com os dois definidos, o resultado da task é entregue por webhook
+    # e a consulta de status vira apenas contingência
+    SALES_BUILDER_CALLBACK_URL: Optional[str] = Field(default=None, env="SALES_BUILDER_CALLBACK_URL")
+    SALES_BUILDER_WEBHOOK_SECRET: Optional[str] = Field(default=None, env="SALES_BUILDER_WEBHOOK_SECRET")
     
     class Config:
         env_file = ".env"
@@ -136,6 +141,12 @@ async def lifespan(app: FastAPI):
     
     # Fechar conexão com o MongoDB ao encerrar a aplicação
     app.mongodb_client.close()
+    
+    # Fechar o pool compartilhado usado no processamento das tasks do Sales Builder
+    from sales_builder_status_checker import close_checker, close_http_client, close_mongo_client
+    await close_checker()
+    await close_http_client()
+    await close_mongo_client()
 
 # 3. Criação da instância app
 app = FastAPI(
@@ -171,7 +182,7 @@ def setup_logging():
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
             structlog.processors.UnicodeDecoder(),
-            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
             structlog.processors.JSONRenderer()
         ],
         context_class=dict,
@@ -252,6 +263,13 @@ class RateLimiter:
                 {"$inc": {"count": 1}, "$set": {"last_request": now}}
             )
 
+# Instância usada pelo endpoint de submissão (pode ser sobrescrita via app.dependency_overrides)
+submit_form_rate_limiter = RateLimiter(times=200, minutes=1)
+
+# Expressões regulares do número de WhatsApp, compiladas uma única vez
+_NON_DIGIT_RE = re.compile(r'\D')
+_WHATSAPP_RE = re.compile(r'^[1-9]\d{1,14}$')
+
 # Função para limpar o número de WhatsApp
 def clean_whatsapp_number(number: str) -> str:
     """
@@ -267,7 +285,7 @@ def clean_whatsapp_number(number: str) -> str:
         str: Número de WhatsApp limpo, contendo apenas dígitos
     """
     # Remove todos os caracteres não numéricos, incluindo o sinal de +
-    return re.sub(r'\D', '', number)
+    return _NON_DIGIT_RE.sub('', number)
 
 # Função para chamar a API Sales Builder
 async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
@@ -284,12 +302,8 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
     api_url = settings.SALES_BUILDER_API_URL
     api_key = settings.SALES_BUILDER_API_KEY
     
-    # Log detalhado da URL e configurações
-    print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - URL: {api_url}")
-    
     if not api_key:
         logger.warning("Chave da API do Sales Builder não configurada. Pulando chamada à API.")
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - ERRO: API key não configurada")
         return {"error": "API key not configured"}
     
     # Máscara para log (mostra apenas os primeiros e últimos 5 caracteres)
@@ -309,9 +323,6 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
         if len(whatsapp) > 6:
             log_payload["whatsapp_prospect"] = f"{whatsapp[:4]}***{whatsapp[-2:]}"
     
-    # Log detalhado do payload completo (sem mascaramento para debug)
-    print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - PAYLOAD COMPLETO: {json.dumps(lead_data, ensure_ascii=False)}")
-    
     logger.info(
         "Iniciando chamada à API Sales Builder",
         url=api_url,
@@ -324,27 +335,14 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
         "Authorization": f"Bearer {api_key}"
     }
     
-    # Log detalhado dos headers (com API key mascarada)
-    headers_log = headers.copy()
-    if "Authorization" in headers_log:
-        auth_parts = headers_log["Authorization"].split(" ")
-        if len(auth_parts) > 1:
-            headers_log["Authorization"] = f"{auth_parts[0]} {masked_key}"
-    
-    print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - HEADERS: {json.dumps(headers_log)}")
+    # Registrar o callback junto com a task; sem o segredo, o webhook fica desabilitado
+    if settings.SALES_BUILDER_CALLBACK_URL and settings.SALES_BUILDER_WEBHOOK_SECRET:
+        lead_data = {**lead_data, "callback_url": settings.SALES_BUILDER_CALLBACK_URL}
     
     try:
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - INICIANDO REQUISIÇÃO HTTP")
         start_time = datetime.utcnow()
         
-        # Log do timeout configurado
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - TIMEOUT CONFIGURADO: 30.0 segundos")
-        
         async with httpx.AsyncClient() as client:
-            print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - CLIENTE HTTP CRIADO")
-            
-            # Log antes de enviar a requisição
-            print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - ENVIANDO REQUISIÇÃO POST")
             
             response = await client.post(
                 api_url,
@@ -353,18 +351,11 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
                 timeout=30.0
             )
             
-            # Log após receber a resposta
-            print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - RESPOSTA RECEBIDA: Status {response.status_code}")
-        
         elapsed_time = (datetime.utcnow() - start_time).total_seconds()
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - TEMPO DE RESPOSTA: {elapsed_time:.2f} segundos")
             
         if response.status_code == 200:
             response_data = response.json()
             
-            # Log detalhado da resposta
-            print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - RESPOSTA COMPLETA: {json.dumps(response_data, ensure_ascii=False)}")
-            
             logger.info(
                 "Chamada à API Sales Builder bem-sucedida",
                 status_code=response.status_code,
@@ -373,9 +364,6 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
             )
             return response_data
         else:
-            # Log detalhado do erro
-            print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - ERRO HTTP: Status {response.status_code}")
-            print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - CORPO DA RESPOSTA DE ERRO: {response.text}")
             
             logger.error(
                 "Erro na chamada à API Sales Builder",
@@ -389,11 +377,6 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
     except httpx.TimeoutException as e:
         elapsed_time = (datetime.utcnow() - start_time).total_seconds() if 'start_time' in locals() else 0
         
-        # Log detalhado do timeout
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - TIMEOUT APÓS {elapsed_time:.2f} SEGUNDOS")
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - DETALHES DO TIMEOUT: {str(e)}")
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - TIPO DE EXCEÇÃO: {type(e).__name__}")
-        
         logger.error(
             "Timeout ao chamar API Sales Builder",
             error=str(e),
@@ -405,11 +388,6 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
     except httpx.RequestError as e:
         elapsed_time = (datetime.utcnow() - start_time).total_seconds() if 'start_time' in locals() else 0
         
-        # Log detalhado do erro de requisição
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - ERRO DE REQUISIÇÃO APÓS {elapsed_time:.2f} SEGUNDOS")
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - DETALHES DO ERRO: {str(e)}")
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - TIPO DE EXCEÇÃO: {type(e).__name__}")
-        
         logger.error(
             "Erro de requisição ao chamar API Sales Builder",
             error=str(e),
@@ -421,27 +399,20 @@ async def call_sales_builder_api(lead_data: dict, settings: Settings) -> dict:
     except Exception as e:
         elapsed_time = (datetime.utcnow() - start_time).total_seconds() if 'start_time' in locals() else 0
         
-        # Log detalhado da exceção genérica
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - EXCEÇÃO INESPERADA APÓS {elapsed_time:.2f} SEGUNDOS")
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - DETALHES DA EXCEÇÃO: {str(e)}")
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - TIPO DE EXCEÇÃO: {type(e).__name__}")
-        import traceback
-        print(f"[{datetime.now().isoformat()}] SALES BUILDER DEBUG - TRACEBACK: {traceback.format_exc()}")
-        
         logger.error(
             "Exceção ao chamar API Sales Builder",
             error=str(e),
             error_type=type(e).__name__,
             elapsed_time_seconds=elapsed_time,
-            traceback=traceback.format_exc(),
-            payload=log_payload
+            payload=log_payload,
+            exc_info=True
         )
         return {"error": f"Exception: {str(e)}"}
 
 # Endpoint principal para submissão de formulário
 @app.post(
     "/submit-form/",
-    dependencies=[Depends(RateLimiter(times=200, minutes=1))],
+    dependencies=[Depends(submit_form_rate_limiter)],
     status_code=status.HTTP_201_CREATED,
     summary="Envia dados do formulário",
     response_description="ID do documento criado no MongoDB",
@@ -484,7 +455,7 @@ async def submit_form(form_data: FormSubmission):
         clean_number = clean_whatsapp_number(form_data.whatsapp_prospect)
         
         # Verifica se o número limpo está em um formato válido
-        if not re.match(r'^[1-9]\d{1,14}$', clean_number):
+        if not _WHATSAPP_RE.match(clean_number):
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail="Número de WhatsApp inválido mesmo após limpeza. Deve conter apenas dígitos."
@@ -517,9 +488,6 @@ async def submit_form(form_data: FormSubmission):
                 request_id=str(request_id.inserted_id)
             )
             
-            # Log no console
-            print(f"[{datetime.now().isoformat()}] LEAD DUPLICADO: Número {clean_number} já existe no banco com ID {str(existing_lead['_id'])}")
-            
             # Atualizar status na fila
             await app.request_queue.update_one(
                 {"_id": request_id.inserted_id},
@@ -555,9 +523,6 @@ async def submit_form(form_data: FormSubmission):
             "spiced_stage": "P1"
         }
         
-        # Log no console antes da inserção
-        print(f"[{datetime.now().isoformat()}] INICIANDO ARMAZENAMENTO: Salvando lead {document['nome_prospect']} no MongoDB")
-        
         # Inserir o lead no MongoDB
         result = await app.collection.insert_one(document)
         
@@ -578,14 +543,8 @@ async def submit_form(form_data: FormSubmission):
             }
         )
         
-        # Log no console após a inserção
-        print(f"[{datetime.now().isoformat()}] ARMAZENAMENTO CONCLUÍDO: Lead salvo com ID {str(result.inserted_id)}")
-        
         logger.info("Form submitted", document_id=str(result.inserted_id), request_id=str(request_id.inserted_id))
         
-        # Log no console antes de chamar a API Sales Builder
-        print(f"[{datetime.now().isoformat()}] INICIANDO INTEGRAÇÃO: Preparando chamada para Sales Builder API")
-        
         # Chamar a API Sales Builder
         try:
             # Preparar os dados para a API Sales Builder
@@ -600,9 +559,6 @@ async def submit_form(form_data: FormSubmission):
                 "interacao": "Iniciar a conversa com lead à partir do P1"
             }
             
-            # Log no console com o payload
-            print(f"[{datetime.now().isoformat()}] PAYLOAD SALES BUILDER: {json.dumps(sales_builder_payload, ensure_ascii=False)}")
-            
             # Atualizar status na fila
             await app.request_queue.update_one(
                 {"_id": request_id.inserted_id},
@@ -622,9 +578,6 @@ async def submit_form(form_data: FormSubmission):
             
             sales_builder_response = await call_sales_builder_api(sales_builder_payload, settings)
             
-            # Log no console após a chamada
-            print(f"[{datetime.now().isoformat()}] RESPOSTA SALES BUILDER: {json.dumps(sales_builder_response, ensure_ascii=False)}")
-            
             # Atualizar status na fila
             await app.request_queue.update_one(
                 {"_id": request_id.inserted_id},
@@ -672,9 +625,6 @@ async def submit_form(form_data: FormSubmission):
                     }
                 )
                 
-                # Log no console para o task_id
-                print(f"[{datetime.now().isoformat()}] TASK ID RECEBIDO: {task_id} para o lead {document['nome_prospect']}")
-                
                 logger.info(
                     "Task ID recebido do Sales Builder",
                     task_id=task_id,
@@ -766,7 +716,7 @@ async def submit_form(form_data: FormSubmission):
                     )
                     
                     # Criar a task em segundo plano
-                    print(f"[{datetime.now().isoformat()}] INICIANDO PROCESSAMENTO ASSÍNCRONO: Task {task_id} para o número {clean_number}")
+                    logger.debug("Iniciando processamento assíncrono da task", task_id=task_id, whatsapp=clean_number)
                     asyncio.create_task(process_task_with_settings(task_id))
                     
                     # Atualizar status na fila
@@ -848,9 +798,6 @@ async def submit_form(form_data: FormSubmission):
                 }
             )
             
-            # Log no console para o erro
-            print(f"[{datetime.now().isoformat()}] ERRO NA INTEGRAÇÃO SALES BUILDER: {error_message}")
-            
             logger.error(
                 "Error calling Sales Builder API", 
                 error=error_message,
@@ -877,6 +824,84 @@ async def submit_form(form_data: FormSubmission):
             detail=f"Erro ao processar formulário: {str(e)}"
         )
 
+# Webhook chamado pelo Sales Builder ao concluir uma task
+@app.post(
+    "/webhooks/sales-builder",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Recebe o resultado de uma task do Sales Builder",
+    response_description="Confirmação do recebimento",
+    tags=["Sales Builder"]
+)
+async def sales_builder_webhook(
+    task_data: Dict[str, Any],
+    x_webhook_secret: Annotated[Optional[str], Header()] = None
+):
+    """
+    Recebe o resultado de uma task do Sales Builder
+    
+    O corpo tem o mesmo formato da resposta de status e é repassado à
+    verificação em segundo plano que aguarda a task, dispensando o polling.
+    Se a verificação ainda não começou, o corpo é guardado até ela começar.
+    
+    O corpo decide quem recebe quais mensagens, então a requisição precisa
+    trazer o segredo do webhook (não a API key dos formulários) e o número
+    de WhatsApp entregue precisa ser o mesmo registrado para a task.
+    
+    Args:
+        task_data: Dados da task concluída
+        x_webhook_secret: Segredo compartilhado com o Sales Builder (header X-Webhook-Secret)
+        
+    Returns:
+        dict: Confirmação do recebimento e ID da task
+        
+    Raises:
+        HTTPException 401: Se o segredo for inválido
+        HTTPException 403: Se o número de WhatsApp não for o registrado para a task
+        HTTPException 404: Se o webhook não estiver configurado ou a task não existir
+    """
+    settings = Settings()
+    
+    if not settings.SALES_BUILDER_WEBHOOK_SECRET:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Webhook do Sales Builder não configurado"
+        )
+    
+    # Comparação em tempo constante, para não revelar o segredo por temporização
+    if not x_webhook_secret or not hmac.compare_digest(
+        x_webhook_secret.encode(), settings.SALES_BUILDER_WEBHOOK_SECRET.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Segredo do webhook inválido"
+        )
+    
+    # A task precisa ter sido criada por esta aplicação, para o mesmo número
+    task_id = task_data.get("task_id")
+    request = None
+    if isinstance(task_id, str) and task_id:
+        request = await app.request_queue.find_one({"task_id": task_id}, {"whatsapp_prospect": 1})
+    if not request:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task não encontrada"
+        )
+    
+    result = task_data.get("result")
+    delivered_number = result.get("whatsapp_prospect") if isinstance(result, dict) else None
+    if not isinstance(delivered_number, str) or clean_whatsapp_number(delivered_number) != request.get("whatsapp_prospect"):
+        logger.warning("Webhook com número de WhatsApp diferente do registrado para a task", task_id=task_id)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Número de WhatsApp não corresponde ao da task"
+        )
+    
+    from sales_builder_status_checker import deliver_task_result
+    delivered = deliver_task_result(task_data)
+    
+    logger.info("Resultado da task recebido via webhook", task_id=task_id, delivered=delivered)
+    return {"message": "Resultado da task recebido", "task_id": task_id}
+
 # Health Check para monitoramento
 @app.get(
     "/health",
@@ -1,24 +1,89 @@
 import httpx
+import orjson
 import asyncio
+import atexit
+import functools
 import logging
+import queue
 import time
 import sys
 import os
+import random
 import re
-import pytz
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Union
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
 import structlog
-from datetime import datetime, timezone
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from pymongo import MongoClient
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 import requests
 import json
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Fuso horário de São Paulo (UTC-3), usado no histórico de chat
+_TZ_SP = ZoneInfo('America/Sao_Paulo')
+
+# Mensagens padrão enviadas quando a task retorna 200 sem msg_resposta
+FALLBACK_MESSAGES = (
+    "Oi, tudo bem? Aqui é o Vagner Campos, fundador da Arduus. Vi seu interesse em inovação e transformação digital no LinkedIn, especialmente na área de IA.",
+    "Percebi que você entrou em contato conosco para conhecer mais sobre nossas soluções de IA generativa. Gostaria de saber mais sobre como podemos impulsionar sua transformação digital?"
+)
+
+# Remove caracteres não numéricos do número de WhatsApp
+_NON_DIGIT_RE = re.compile(r'\D')
+
+# Variáveis de ambiente lidas uma única vez na importação do módulo
+_ENV_MONGO_URI = os.getenv("MONGO_URI")
+_ENV_DB_NAME = os.getenv("DB_NAME")
+_ENV_SALES_BUILDER_KEY = os.getenv("SALES_BUILDER_API_KEY")
+_ENV_SALES_BUILDER_KEY_ALT = os.getenv("SALES_BUILDER_API_KEY_ALT")
+
+# Driver MongoDB: Motor por padrão; mongojet (driver em Rust) opcional via USE_MONGOJET=1
+USE_MONGOJET = os.getenv("USE_MONGOJET") == "1"
+if USE_MONGOJET:
+    try:
+        from mongojet import create_client as mongojet_create_client
+    except ImportError:
+        logging.warning("USE_MONGOJET=1, mas o pacote mongojet não está instalado. Usando Motor.")
+        USE_MONGOJET = False
+
+# Clientes MongoDB compartilhados entre as tasks, por URI (ver _get_mongo_client)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+_mongo_clients: Dict[str, Any] = {}
+
+# Cliente HTTP compartilhado com a API Sales Builder (pool de conexões reutilizado entre tasks)
+HTTPX_MAX_CONNECTIONS = int(os.getenv("HTTPX_MAX_CONNECTIONS", "200"))
+HTTPX_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTPX_MAX_KEEPALIVE_CONNECTIONS", "100"))
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Tamanho máximo de cada lote gravado pelo writer de histórico
+HISTORY_BATCH_SIZE = 100
+
+# Limite de requisições simultâneas de status ao Sales Builder, compartilhado por todas as instâncias
+_POLL_SEMAPHORE = asyncio.Semaphore(int(os.getenv("SALES_BUILDER_MAX_CONCURRENT_POLLS", "32")))
+
+# Limite de envios simultâneos de WhatsApp, compartilhado por todas as instâncias
+_SEND_SEMAPHORE = asyncio.Semaphore(int(os.getenv("SALES_BUILDER_MAX_CONCURRENT_SENDS", "10")))
+
+# Espera máxima pelo resultado via webhook antes de recorrer à consulta de status, em segundos
+WEBHOOK_TIMEOUT = float(os.getenv("SALES_BUILDER_WEBHOOK_TIMEOUT", "600"))
+
+# Intervalo das consultas de status feitas enquanto o webhook não chega, em segundos
+WEBHOOK_POLL_INTERVAL = float(os.getenv("SALES_BUILDER_WEBHOOK_POLL_INTERVAL", "60"))
+
+# Verificações aguardando o webhook do Sales Builder: task_id -> Future com o corpo recebido
+_pending_tasks: Dict[str, asyncio.Future] = {}
+
+# Webhooks recebidos antes de a verificação da task começar: task_id -> (expiração, corpo)
+_early_results: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_EARLY_RESULTS_MAX = 1000
+
 # Garantir que o diretório atual esteja no PYTHONPATH
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
@@ -42,18 +107,35 @@ except ImportError:
         class EvolutionAPI:
             def __init__(self, settings=None):
                 logging.warning("Usando versão stub da EvolutionAPI porque o módulo não pôde ser importado")
+                
+                # Sessão HTTP reutilizada entre os envios, com retry para problemas de SSL
+                self._retry = requests.adapters.Retry(
+                    total=3,  # número total de tentativas
+                    backoff_factor=1,  # fator de espera entre tentativas
+                    status_forcelist=[429, 500, 502, 503, 504],  # códigos de status para retry
+                    allowed_methods=["POST"],  # métodos permitidos para retry
+                )
+                self._session = requests.Session()
+                self._session.mount(
+                    "https://",
+                    requests.adapters.HTTPAdapter(max_retries=self._retry, pool_connections=20, pool_maxsize=50)
+                )
+            
+            def close(self):
+                self._session.close()
+            
+            async def aclose(self):
+                self.close()
             
             def send_text_message(self, number, text, **kwargs):
                 url = f"https://{self.evo_subdomain}/message/sendText/{self.evo_instance}"
                 
-                # Log no console
-                print(f"[{datetime.now().isoformat()}] EVOLUTION API - PREPARANDO MENSAGEM: Para {number}")
+                logger.debug("Preparando mensagem na Evolution API", number=number)
                 
                 # Verificar se a API está configurada
                 if not self.is_configured:
                     error_msg = "Evolution API não está configurada corretamente. Não é possível enviar mensagens."
                     logging.error(error_msg)
-                    print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: Configuração incompleta")
                     return {"status": "error", "message": error_msg}
                 
                 # Calcular o tempo de digitação
@@ -69,28 +151,14 @@ except ImportError:
                 for key, value in kwargs.items():
                     payload[key] = value
                 
-                # Configurar sessão com retry para problemas de SSL
-                retry_strategy = requests.adapters.Retry(
-                    total=3,  # número total de tentativas
-                    backoff_factor=1,  # fator de espera entre tentativas
-                    status_forcelist=[429, 500, 502, 503, 504],  # códigos de status para retry
-                    allowed_methods=["POST"],  # métodos permitidos para retry
-                )
-                
-                # Criar sessão com timeout maior e configuração de retry
-                session = requests.Session()
-                adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-                session.mount("https://", adapter)
-                
                 try:
-                    # Log no console antes de enviar
-                    print(f"[{datetime.now().isoformat()}] EVOLUTION API - ENVIANDO: Mensagem para {number} (tempo de digitação: {typing_time}ms)")
+                    logger.debug("Enviando mensagem pela Evolution API", number=number, typing_time_ms=typing_time)
                     
                     logging.info(f"[EVO_API] Enviando mensagem para {number}: '{text[:50]}...'")
                     logging.debug(f"[EVO_API] URL: {url}, Payload: {json.dumps(payload)[:200]}...")
                     
                     # Usar a sessão com retry e timeout maior
-                    response = session.post(
+                    response = self._session.post(
                         url, 
                         json=payload, 
                         headers=self.headers, 
@@ -99,8 +167,7 @@ except ImportError:
                     
                     # Tratar status 200 e 201 como sucesso (201 = Created)
                     if response.status_code in [200, 201]:
-                        # Log no console após enviar com sucesso
-                        print(f"[{datetime.now().isoformat()}] EVOLUTION API - ENVIADO: Status {response.status_code} para {number}")
+                        logger.debug("Mensagem enviada pela Evolution API", number=number, status_code=response.status_code)
                         
                         logging.info(f"[EVO_API] Mensagem enviada com sucesso para {number}. Status: {response.status_code}")
                         try:
@@ -111,7 +178,6 @@ except ImportError:
                             if isinstance(response_data, dict) and response_data.get("error"):
                                 error_msg = response_data.get("error", {}).get("message", "Erro desconhecido na resposta")
                                 logging.error(f"[EVO_API] Erro na resposta: {error_msg}")
-                                print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
                                 return {"status": "error", "message": error_msg}
                             
                             return response_data
@@ -122,37 +188,34 @@ except ImportError:
                     else:
                         error_msg = f"Falha ao enviar mensagem. Status: {response.status_code}, Resposta: {response.text[:200]}"
                         logging.error(f"[EVO_API] {error_msg}")
-                        print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: Resposta com status {response.status_code}")
                         # Não chamar raise_for_status() aqui para evitar exceção
                         return {"status": "error", "status_code": response.status_code, "message": error_msg}
                 except requests.exceptions.Timeout:
                     error_msg = f"Timeout ao enviar mensagem para {number} após 60 segundos"
                     logging.error(f"[EVO_API] {error_msg}")
-                    print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
                     return {"status": "error", "message": error_msg}
                 except requests.exceptions.SSLError as e:
                     error_msg = f"Erro SSL ao enviar mensagem para {number}: {str(e)}"
                     logging.error(f"[EVO_API] {error_msg}")
-                    print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
                     return {"status": "error", "message": error_msg}
                 except requests.exceptions.ConnectionError as e:
                     error_msg = f"Erro de conexão ao enviar mensagem para {number}: {str(e)}"
                     logging.error(f"[EVO_API] {error_msg}")
-                    print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
                     return {"status": "error", "message": error_msg}
                 except requests.exceptions.RequestException as e:
                     error_msg = f"Erro na requisição ao enviar mensagem para {number}: {str(e)}"
                     logging.error(f"[EVO_API] {error_msg}")
-                    print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
                     return {"status": "error", "message": error_msg}
                 except Exception as e:
                     error_msg = f"Erro inesperado ao enviar mensagem para {number}: {str(e)}"
                     logging.error(f"[EVO_API] {error_msg}")
-                    print(f"[{datetime.now().isoformat()}] EVOLUTION API - ERRO: {error_msg}")
                     return {"status": "error", "message": error_msg}
-                finally:
-                    # Fechar a sessão
-                    session.close()
+            
+            async def send_text_message_async(self, number, text, **kwargs):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    None, functools.partial(self.send_text_message, number, text, **kwargs)
+                )
 
 # Configuração de logging com structlog
 def setup_logging():
@@ -171,7 +234,7 @@ def setup_logging():
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
             structlog.processors.UnicodeDecoder(),
-            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
             structlog.processors.JSONRenderer()
         ],
         context_class=dict,
@@ -179,10 +242,336 @@ def setup_logging():
         wrapper_class=structlog.stdlib.BoundLogger,
         cache_logger_on_first_use=True,
     )
+    setup_log_queue("sales_builder_status_checker")
+
+def setup_log_queue(logger_name: str):
+    """
+    Desvia a escrita dos logs para uma thread em segundo plano
+
+    O logger recebe um QueueHandler, que apenas enfileira o registro já
+    renderizado pelo structlog; um QueueListener consome a fila e faz a
+    escrita em stdout fora do event loop.
+
+    Args:
+        logger_name: Nome do logger da biblioteca padrão a ser configurado
+    """
+    std_logger = logging.getLogger(logger_name)
+    # Nível configurável por variável de ambiente (ex.: LOG_LEVEL=WARNING em produção)
+    std_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    if any(isinstance(handler, QueueHandler) for handler in std_logger.handlers):
+        return
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    std_logger.addHandler(QueueHandler(log_queue))
+    std_logger.propagate = False
 
 setup_logging()
 logger = structlog.get_logger("sales_builder_status_checker")
 
+def _extract_result_and_msgs(data: Optional[Dict[str, Any]]):
+    """
+    Extrai o campo result e a lista msg_resposta de uma resposta do Sales Builder
+    
+    Args:
+        data: Dados retornados pela API Sales Builder
+        
+    Returns:
+        tuple: (result, msg_resposta), com None para os campos ausentes
+    """
+    result = (data or {}).get("result") or {}
+    return result or None, result.get("msg_resposta")
+
+def _validate_task(task_data: Dict[str, Any]) -> Optional[Tuple[str, List[str]]]:
+    """
+    Valida a resposta de uma task antes de qualquer I/O
+    
+    Aplica o fallback de mensagens padrão (registrando-o em task_data) e limpa
+    o número de WhatsApp. Cada falha é registrada no log com o motivo.
+    
+    Args:
+        task_data: Dados da task do Sales Builder
+        
+    Returns:
+        tuple: (whatsapp, messages) se a task for válida, None caso contrário
+    """
+    # Verificar se há erro na resposta
+    if "error" in task_data:
+        logger.error(f"Erro na resposta da API: {task_data.get('error')}")
+        return None
+    
+    # Verificar se temos os dados necessários
+    result = task_data.get("result") or {}
+    if not task_data.get("task_id") or not result:
+        logger.error(f"Dados incompletos na task: {task_data}")
+        return None
+    
+    # Extrair o número de WhatsApp e as mensagens
+    whatsapp = result.get("whatsapp_prospect")
+    messages = result.get("msg_resposta") or []
+    if not isinstance(messages, list):
+        messages = []
+    
+    if not messages:
+        # Fallback: Se a task retornou 200 sem mensagens, usar mensagens padrão
+        if task_data.get("status_code") != 200:
+            logger.error(f"Dados incompletos na task: {task_data}")
+            return None
+        
+        logger.info("Task retornou 200 com lista de mensagens vazia. Usando mensagens padrão de fallback.")
+        messages = list(FALLBACK_MESSAGES)
+        
+        # Atualizar o task_data com as mensagens de fallback para que sejam armazenadas na fila
+        result["msg_resposta"] = messages
+        task_data["fallback_messages_used"] = True
+    
+    if not whatsapp:
+        logger.error(f"Dados incompletos na task: {task_data}")
+        return None
+    
+    # Verificar se o número de WhatsApp está em um formato válido
+    if not whatsapp.isdigit():
+        logger.warning(f"Número de WhatsApp inválido: {whatsapp}. Tentando limpar...")
+        # Tentar limpar o número
+        whatsapp = _NON_DIGIT_RE.sub('', whatsapp)
+        if not whatsapp:
+            logger.error(f"Número de WhatsApp ainda inválido após limpeza: {whatsapp}")
+            return None
+    
+    return whatsapp, messages
+
+def _build_history_doc(whatsapp: str, message: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Monta o documento de histórico de chat para uma mensagem enviada
+    
+    Args:
+        whatsapp: Número de WhatsApp do destinatário
+        message: Mensagem enviada
+        task_data: Dados da task do Sales Builder
+        
+    Returns:
+        Dict: Documento pronto para inserção em sdr_chat_histories
+    """
+    # Extrair dados relevantes da task
+    r = task_data.get("result") or {}
+    
+    return {
+        'session_id': whatsapp,
+        'status': r.get('status', ''),
+        'data_hora': datetime.now(_TZ_SP).isoformat(),  # Horário de São Paulo
+        'p_atual': r.get('p_atual', ''),
+        'p_proxima': r.get('p_proxima', ''),
+        'interacao': r.get('interacao', ''),
+        'tipo_interacao': r.get('tipo_interacao', 'whatsapp'),
+        'msg_resposta': [message],  # Mensagem que acabou de ser enviada
+        'periodo_agendamento': r.get('periodo_agendamento', ''),
+        'horario_agendamento': r.get('horario_agendamento', ''),
+        'dia_agendamento': r.get('dia_agendamento', ''),
+        'link_agendamento_google_calendar': r.get('link_agendamento_google_calendar', 'NULL'),
+        'link_meet_google': r.get('link_meet_google', 'NULL')
+    }
+
+async def _get_mongo_client(uri: str):
+    """
+    Retorna o cliente MongoDB assíncrono compartilhado para a URI informada
+    
+    O cliente (e seu pool de conexões) é criado na primeira chamada e
+    reutilizado por todas as tasks; é fechado por close_mongo_client().
+    
+    Args:
+        uri: URI de conexão com o MongoDB
+        
+    Returns:
+        Cliente mongojet (se USE_MONGOJET=1) ou AsyncIOMotorClient
+    """
+    client = _mongo_clients.get(uri)
+    if client is None:
+        if USE_MONGOJET:
+            client = await mongojet_create_client(uri)
+        else:
+            client = AsyncIOMotorClient(uri, maxPoolSize=MONGO_MAX_POOL_SIZE)
+        _mongo_clients[uri] = client
+    return client
+
+async def close_mongo_client() -> None:
+    """Fecha os clientes MongoDB compartilhados (chamado no encerramento da aplicação)."""
+    while _mongo_clients:
+        _, client = _mongo_clients.popitem()
+        # close() é síncrono no Motor e assíncrono no mongojet
+        closing = client.close()
+        if asyncio.iscoroutine(closing):
+            await closing
+
+async def get_http_client() -> httpx.AsyncClient:
+    """
+    Retorna o cliente HTTP compartilhado com a API Sales Builder
+    
+    O cliente é criado na primeira chamada e reutilizado por todos os
+    verificadores; headers e timeout são informados a cada requisição.
+    É fechado por close_http_client().
+    
+    Returns:
+        httpx.AsyncClient: Cliente com limites de conexão configuráveis por variáveis de ambiente
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTPX_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTPX_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30
+            )
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    """Fecha o cliente HTTP compartilhado (chamado no encerramento da aplicação)."""
+    global _http_client
+    if _http_client is not None:
+        client, _http_client = _http_client, None
+        await client.aclose()
+
+def deliver_task_result(task_data: Dict[str, Any]) -> bool:
+    """
+    Entrega o corpo recebido pelo webhook do Sales Builder à verificação que aguarda a task
+    
+    Se a verificação ainda não começou (o webhook pode chegar antes da task em segundo
+    plano), o corpo é guardado por WEBHOOK_TIMEOUT segundos e entregue quando ela começar.
+    
+    Args:
+        task_data: Corpo do webhook, no mesmo formato da resposta de status
+        
+    Returns:
+        bool: True se havia uma verificação aguardando a task, False se o corpo foi guardado
+    """
+    task_id = task_data.get("task_id")
+    future = _pending_tasks.get(task_id)
+    if future is not None and not future.done():
+        future.set_result(task_data)
+        return True
+    
+    # Descartar entregas expiradas e, no limite, a mais antiga
+    now = time.monotonic()
+    for expired in [key for key, (expires_at, _) in _early_results.items() if expires_at <= now]:
+        del _early_results[expired]
+    if len(_early_results) >= _EARLY_RESULTS_MAX:
+        del _early_results[next(iter(_early_results))]
+    _early_results[task_id] = (now + WEBHOOK_TIMEOUT, task_data)
+    return False
+
+def _result_field(result, name: str):
+    """Lê um campo do resultado de escrita (objeto no Motor, dict no mongojet)."""
+    return result[name] if isinstance(result, dict) else getattr(result, name)
+
+def _step(step: str, success: bool, message: str, timestamp: Optional[datetime] = None, **extra) -> Dict[str, Any]:
+    """
+    Monta uma entrada do histórico de passos (steps) de uma requisição da fila
+    
+    Args:
+        step: Nome do passo
+        success: Se o passo foi bem-sucedido
+        message: Descrição do passo
+        timestamp: Momento do passo em UTC (padrão: agora)
+        **extra: Campos adicionais do passo
+        
+    Returns:
+        Dict: Entrada no formato gravado em request_queue.steps
+    """
+    return {"step": step, "timestamp": timestamp or datetime.utcnow(), "success": success, "message": message, **extra}
+
+class RequestProgress:
+    """
+    Acumula os passos de processamento de uma requisição da fila (request_queue)
+    e os grava no MongoDB em um único update_one (update com pipeline de agregação).
+    
+    Sem request_queue ou request_id, os registros são ignorados.
+    """
+    
+    def __init__(self, request_queue=None, request_id: Optional[Union[str, ObjectId]] = None):
+        """
+        Inicializa o acumulador de passos.
+        
+        Args:
+            request_queue: Referência à coleção de fila de requisições (opcional)
+            request_id: ID da requisição na fila, como str ou ObjectId (opcional)
+        """
+        self.request_queue = request_queue
+        self.request_id = request_id
+        # ObjectId calculado uma única vez para todos os flushes
+        self.request_oid = None
+        if request_id is not None:
+            try:
+                self.request_oid = request_id if isinstance(request_id, ObjectId) else ObjectId(request_id)
+            except (InvalidId, TypeError):
+                logger.error("ID de requisição inválido; a fila não será atualizada", request_id=str(request_id))
+        self._fields: Dict[str, Any] = {}
+        self._computed: Dict[str, Any] = {}
+        self._steps: List[Dict[str, Any]] = []
+    
+    @property
+    def enabled(self) -> bool:
+        """Indica se há uma requisição da fila a ser atualizada."""
+        return self.request_queue is not None and self.request_oid is not None
+    
+    def record_step(self, step: str, success: bool, message: str, status: Optional[str] = None, **extra):
+        """
+        Registra um passo de processamento a ser gravado no próximo flush.
+        
+        Args:
+            step: Nome do passo
+            success: Se o passo foi bem-sucedido
+            message: Descrição do passo
+            status: Novo status da requisição (opcional)
+            **extra: Campos adicionais do passo
+        """
+        if not self.enabled:
+            return
+        self._steps.append(_step(step, success, message, **extra))
+        if status:
+            self._fields["status"] = status
+    
+    def set_fields(self, **fields):
+        """Registra campos da requisição a serem atualizados com $set no próximo flush."""
+        if self.enabled:
+            self._fields.update(fields)
+    
+    def set_computed(self, **expressions):
+        """
+        Registra campos calculados pelo MongoDB no próximo flush.
+        
+        As expressões de agregação são avaliadas depois de gravados os campos
+        de set_fields, então podem referenciá-los (ex.: {"$size": "$messages"}).
+        """
+        if self.enabled:
+            self._computed.update(expressions)
+    
+    async def flush(self):
+        """Grava os campos e passos pendentes em um único update_one com pipeline."""
+        if not self.enabled or not (self._fields or self._computed or self._steps):
+            return
+        
+        # $literal impede que valores iniciados por "$" sejam lidos como expressões
+        stage: Dict[str, Any] = {name: {"$literal": value} for name, value in self._fields.items()}
+        if self._steps:
+            stage["steps"] = {"$concatArrays": [{"$ifNull": ["$steps", []]}, {"$literal": self._steps}]}
+        pipeline = [{"$set": stage}] if stage else []
+        if self._computed:
+            pipeline.append({"$set": self._computed})
+        self._fields, self._computed, self._steps = {}, {}, []
+        
+        try:
+            await self.request_queue.update_one({"_id": self.request_oid}, pipeline)
+        except Exception as e:
+            logger.error(
+                "Erro ao atualizar a requisição na fila",
+                request_id=str(self.request_id),
+                error=str(e),
+                error_type=type(e).__name__
+            )
+
 class SalesBuilderStatusChecker:
     """
     Classe responsável por verificar o status de tasks do Sales Builder
@@ -190,7 +579,10 @@ class SalesBuilderStatusChecker:
     """
     
     def __init__(self, api_url: str = "https://sales-builder.ornexus.com", api_key: str = None, 
-                 max_retries: int = 20, retry_delay: int = 15, timeout: int = 60, settings=None):
+                 max_retries: int = 20, retry_base: float = 2.0, retry_cap: float = 60.0, timeout: int = 60,
+                 settings=None, max_concurrent_polls: Optional[int] = None,
+                 total_timeout: Optional[float] = None, webhook_timeout: Optional[float] = None,
+                 webhook_poll_interval: Optional[float] = None):
         """
         Inicializa o verificador de status do Sales Builder.
         
@@ -198,15 +590,37 @@ class SalesBuilderStatusChecker:
             api_url: URL base da API Sales Builder
             api_key: Chave de API para autenticação (opcional)
             max_retries: Número máximo de tentativas em caso de erro (padrão: 20)
-            retry_delay: Tempo de espera entre tentativas em segundos (padrão: 15)
+            retry_base: Espera base entre tentativas em segundos, dobrada a cada tentativa (padrão: 2)
+            retry_cap: Espera máxima entre tentativas em segundos (padrão: 60)
             timeout: Timeout da requisição HTTP (em segundos)
             settings: Configurações da aplicação principal (opcional)
+            max_concurrent_polls: Limite próprio de consultas de status simultâneas (opcional;
+                por padrão usa o limite compartilhado do módulo)
+            total_timeout: Tempo máximo total da verificação de status em segundos
+                (padrão: max_retries * (retry_cap + timeout))
+            webhook_timeout: Espera máxima pelo webhook quando SALES_BUILDER_CALLBACK_URL e
+                SALES_BUILDER_WEBHOOK_SECRET estão configurados, antes de consultar o status
+                (padrão: WEBHOOK_TIMEOUT)
+            webhook_poll_interval: Intervalo das consultas de status feitas enquanto o
+                webhook não chega (padrão: WEBHOOK_POLL_INTERVAL)
         """
         self.api_url = api_url
         self.max_retries = max_retries
-        self.retry_delay = retry_delay
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
         self.timeout = timeout
+        self.total_timeout = total_timeout or max_retries * (retry_cap + timeout)
         self.settings = settings
+        # Com a URL de callback e o segredo configurados, o Sales Builder entrega o resultado via webhook
+        self.use_webhook = bool(
+            getattr(settings, "SALES_BUILDER_CALLBACK_URL", None)
+            and getattr(settings, "SALES_BUILDER_WEBHOOK_SECRET", None)
+        )
+        self.webhook_timeout = webhook_timeout or WEBHOOK_TIMEOUT
+        self.webhook_poll_interval = webhook_poll_interval or WEBHOOK_POLL_INTERVAL
+        self.poll_semaphore = (
+            asyncio.Semaphore(max_concurrent_polls) if max_concurrent_polls else _POLL_SEMAPHORE
+        )
         
         # Obter a chave de API do Sales Builder
         # Prioridade: 1. Parâmetro api_key, 2. Settings, 3. Variável de ambiente
@@ -216,7 +630,7 @@ class SalesBuilderStatusChecker:
             self.api_key = settings.SALES_BUILDER_API_KEY
         else:
             # Carregar do .env via python-dotenv
-            self.api_key = os.getenv("SALES_BUILDER_API_KEY")
+            self.api_key = _ENV_SALES_BUILDER_KEY
             if not self.api_key:
                 logger.warning("Chave de API do Sales Builder não encontrada. Algumas funcionalidades podem não estar disponíveis.")
         
@@ -236,31 +650,198 @@ class SalesBuilderStatusChecker:
             "Content-Type": "application/json"
         }
         
-        # Cliente HTTP
-        self.client = httpx.AsyncClient(
-            timeout=timeout,
-            headers=self.headers
-        )
-        
         # Referência para o MongoDB (será definida durante o processamento)
         self.mongodb = None
+        
+        # Fila de históricos de chat, gravados em lote por uma task em segundo plano
+        self._history_queue: asyncio.Queue = asyncio.Queue()
+        self._history_writer: Optional[asyncio.Task] = None
+    
+    @property
+    def evo_api(self):
+        """Cliente da Evolution API usado para enviar as mensagens."""
+        return self._evo_api
+    
+    @evo_api.setter
+    def evo_api(self, evo_api):
+        # A configuração é verificada uma única vez, ao atribuir o cliente
+        self._evo_api = evo_api
+        self._evo_ok = bool(getattr(evo_api, "is_configured", False))
     
     async def close(self):
-        """Fecha o cliente HTTP."""
-        await self.client.aclose()
+        """
+        Grava os históricos pendentes e fecha a sessão da Evolution API.
+        
+        O cliente HTTP do Sales Builder é compartilhado e fechado por close_http_client().
+        """
+        await self.flush_history()
+        await self.evo_api.aclose()
+    
+    def _enqueue_history(self, docs: List[Dict[str, Any]]):
+        """
+        Enfileira documentos de histórico para gravação em segundo plano.
+        
+        O writer é iniciado na primeira chamada, já dentro do event loop.
+        
+        Args:
+            docs: Documentos montados com _build_history_doc
+        """
+        for doc in docs:
+            self._history_queue.put_nowait(doc)
+        if self._history_writer is None or self._history_writer.done():
+            self._history_writer = asyncio.create_task(self._drain_history())
+    
+    async def _drain_history(self):
+        """Consome a fila de históricos, gravando até HISTORY_BATCH_SIZE documentos por vez."""
+        while True:
+            batch = [await self._history_queue.get()]
+            try:
+                while len(batch) < HISTORY_BATCH_SIZE:
+                    batch.append(self._history_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                pass
+            
+            try:
+                # insert_chat_histories_bulk já registra e devolve os erros
+                await self.insert_chat_histories_bulk(batch)
+            except Exception as e:
+                logger.error("Erro no writer de históricos de chat", error=str(e), document_count=len(batch))
+            finally:
+                for _ in batch:
+                    self._history_queue.task_done()
+    
+    async def flush_history(self):
+        """Aguarda a gravação de todos os históricos enfileirados e encerra o writer."""
+        if self._history_writer is None:
+            return
+        if not self._history_writer.done():
+            await self._history_queue.join()
+            self._history_writer.cancel()
+            try:
+                await self._history_writer
+            except asyncio.CancelledError:
+                pass
+        self._history_writer = None
+    
+    def _retry_delay(self, attempt: int) -> float:
+        """
+        Calcula a espera antes da próxima consulta (backoff exponencial com jitter).
+        
+        Args:
+            attempt: Número de tentativas já feitas (1 para a primeira espera)
+            
+        Returns:
+            float: Espera em segundos, limitada a retry_cap e multiplicada por um fator entre 0,5 e 1,5
+        """
+        return min(self.retry_cap, self.retry_base * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
     
-    async def check_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+    async def wait_for_task(self, task_id: str, timeout: Optional[float] = None,
+                            headers: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Aguarda o resultado da task entregue pelo webhook do Sales Builder.
+        
+        Enquanto espera, consulta o status uma vez a cada webhook_poll_interval segundos:
+        o webhook pode se perder ou ser entregue a outra instância da aplicação.
+        
+        Args:
+            task_id: ID da task aguardada
+            timeout: Espera máxima em segundos (padrão: webhook_timeout)
+            headers: Headers das consultas de status (padrão: self.headers)
+            
+        Returns:
+            Dict com os dados da task concluída (ou o erro de autorização da consulta),
+            ou None se não chegarem a tempo
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        # O webhook pode ter chegado antes de a verificação começar
+        early = _early_results.pop(task_id, None)
+        if early is not None and early[0] > time.monotonic():
+            future.set_result(early[1])
+        _pending_tasks[task_id] = future
+        
+        url = f"{self.api_url}/status/{task_id}"
+        deadline = loop.time() + (timeout or self.webhook_timeout)
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                done, _ = await asyncio.wait({future}, timeout=min(self.webhook_poll_interval, remaining))
+                if done:
+                    logger.info("Resultado da task recebido via webhook", task_id=task_id)
+                    # O webhook só é enviado com a task concluída, equivalente a uma resposta 200
+                    return {**future.result(), "status_code": 200}
+                
+                task_data = await self._fetch_status_once(task_id, url, headers or self.headers)
+                if task_data is not None:
+                    return task_data
+        finally:
+            if _pending_tasks.get(task_id) is future:
+                del _pending_tasks[task_id]
+    
+    async def _fetch_status_once(self, task_id: str, url: str, headers: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        Consulta o status da task uma única vez, sem novas tentativas.
+        
+        Args:
+            task_id: ID da task
+            url: URL de status da task
+            headers: Headers da consulta
+            
+        Returns:
+            Dict com os dados da task se ela já tiver mensagens, o erro em caso de 403,
+            ou None se ainda não houver resultado
+        """
+        client = await get_http_client()
+        try:
+            async with self.poll_semaphore:
+                response = await client.get(url, headers=headers, timeout=self.timeout)
+            
+            if response.status_code == 403:
+                return {"error": f"{response.status_code}: Erro de autorização", "task_id": task_id}
+            if response.status_code != 200:
+                return None
+            
+            response_data = orjson.loads(response.content)
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            logger.warning("Erro ao consultar status enquanto aguarda o webhook", task_id=task_id, error=str(e))
+            return None
+        
+        _, messages = _extract_result_and_msgs(response_data)
+        if not messages:
+            return None
+        
+        logger.info("Task concluída encontrada na consulta de status", task_id=task_id)
+        response_data["status_code"] = 200
+        return response_data
+    
+    async def check_task_status(self, task_id: str, headers: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
         """
         Verifica o status de uma task do Sales Builder.
         
+        Com o webhook habilitado, aguarda primeiro a entrega do resultado (com consultas
+        de status espaçadas) e só volta à consulta frequente se ela não chegar dentro de
+        webhook_timeout.
+        
         Args:
             task_id: ID da task a ser verificada
+            headers: Headers das consultas desta verificação (padrão: self.headers); o
+                verificador é compartilhado entre tasks, então não deve ser alterado por uma delas
             
         Returns:
             Dict contendo os dados da resposta ou None em caso de erro
         """
-        # Log no console
-        print(f"[{datetime.now().isoformat()}] CONSULTANDO STATUS: Verificando status da task {task_id}")
+        if self.use_webhook:
+            task_data = await self.wait_for_task(task_id, headers=headers)
+            if task_data is not None:
+                return task_data
+            logger.warning(
+                "Resultado da task não chegou via webhook; consultando status",
+                task_id=task_id,
+                webhook_timeout_seconds=self.webhook_timeout
+            )
         
         url = f"{self.api_url}/status/{task_id}"
         
@@ -276,17 +857,57 @@ class SalesBuilderStatusChecker:
             api_key_masked=masked_key
         )
         
+        # Orçamento total da verificação: ao expirar (ou se o chamador cancelar),
+        # a requisição em andamento é cancelada e a conexão liberada
+        last_body: Dict[str, Any] = {}
+        try:
+            async with asyncio.timeout(self.total_timeout):
+                return await self._poll_task_status(task_id, url, last_body, headers or self.headers)
+        except TimeoutError:
+            if last_body:
+                # A task já respondeu 200, ainda sem mensagens: devolver a última
+                # resposta para acionar o fallback, como ao esgotar as tentativas
+                logger.warning(
+                    "Tempo total de verificação excedido aguardando mensagens",
+                    task_id=task_id,
+                    total_timeout_seconds=self.total_timeout
+                )
+                return {**last_body, "status_code": 200}
+            logger.error(
+                "Tempo total de verificação da task excedido",
+                task_id=task_id,
+                total_timeout_seconds=self.total_timeout
+            )
+            return {"error": "Tempo total de verificação da task excedido", "task_id": task_id}
+    
+    async def _poll_task_status(self, task_id: str, url: str, last_body: Dict[str, Any],
+                                headers: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Consulta o status da task repetidamente até obter as mensagens ou esgotar as tentativas.
+        
+        Args:
+            task_id: ID da task a ser verificada
+            url: URL de status da task
+            last_body: Preenchido com o corpo da última resposta 200, reaproveitado em
+                respostas 304 e pelo chamador se o orçamento total expirar
+            headers: Headers enviados em cada consulta
+            
+        Returns:
+            Dict contendo os dados da resposta ou a descrição do erro
+        """
         retries = 0
         start_time_total = datetime.utcnow()
+        client = await get_http_client()
+        # ETag da última resposta 200, para consultas condicionais (If-None-Match)
+        etag = None
         
         while retries < self.max_retries:
             try:
                 # Log detalhado da tentativa atual
                 elapsed_total = (datetime.utcnow() - start_time_total).total_seconds()
-                print(f"[{datetime.now().isoformat()}] TENTATIVA {retries+1}/{self.max_retries}: Verificando status da task {task_id} (tempo total: {elapsed_total:.2f}s)")
                 
                 start_time = datetime.utcnow()
-                logger.info(
+                logger.debug(
                     "Iniciando requisição para verificar status",
                     task_id=task_id,
                     attempt=retries+1,
@@ -294,11 +915,13 @@ class SalesBuilderStatusChecker:
                     elapsed_total_seconds=elapsed_total
                 )
                 
-                response = await self.client.get(url, timeout=self.timeout)
+                request_headers = headers if etag is None else {**headers, "If-None-Match": etag}
+                async with self.poll_semaphore:
+                    response = await client.get(url, headers=request_headers, timeout=self.timeout)
                 elapsed_time = (datetime.utcnow() - start_time).total_seconds()
                 
                 # Log da resposta para depuração
-                logger.info(
+                logger.debug(
                     "Resposta recebida da API Sales Builder",
                     task_id=task_id,
                     status_code=response.status_code,
@@ -306,16 +929,22 @@ class SalesBuilderStatusChecker:
                     elapsed_total_seconds=elapsed_total
                 )
                 
-                if response.status_code == 200:
-                    response_data = response.json()
+                not_modified = response.status_code == 304 and bool(last_body)
+                if response.status_code == 200 or not_modified:
+                    if not_modified:
+                        # Nada mudou desde a última consulta: reaproveitar o corpo já decodificado
+                        response_data = dict(last_body)
+                    else:
+                        # orjson decodifica o corpo bruto mais rápido que o json da biblioteca padrão
+                        response_data = orjson.loads(response.content)
+                        etag = response.headers.get("ETag")
+                        last_body.clear()
+                        last_body.update(response_data)
                     
                     # Verificar se o campo msg_resposta existe e não está vazio
-                    has_messages = False
-                    if "result" in response_data and response_data["result"]:
-                        if "msg_resposta" in response_data["result"] and response_data["result"]["msg_resposta"]:
-                            has_messages = True
+                    _, messages = _extract_result_and_msgs(response_data)
                     
-                    if has_messages:
+                    if messages:
                         logger.info(
                             "Task completada com sucesso e contém mensagens",
                             task_id=task_id,
@@ -323,21 +952,22 @@ class SalesBuilderStatusChecker:
                             response_data=response_data,
                             elapsed_total_seconds=elapsed_total
                         )
-                        print(f"[{datetime.now().isoformat()}] STATUS OBTIDO: Task {task_id} completada com sucesso após {elapsed_total:.2f}s")
                         # Incluir status_code na resposta
-                        response_data["status_code"] = response.status_code
+                        response_data["status_code"] = 200
                         return response_data
                     else:
+                        # Incrementar contador de tentativas
+                        retries += 1
+                        delay = self._retry_delay(retries)
+                        
                         logger.warning(
                             "Task retornou status 200 mas não contém mensagens. Aguardando...",
                             task_id=task_id,
                             status_code=response.status_code,
+                            attempt=retries,
+                            retry_delay_seconds=delay,
                             elapsed_total_seconds=elapsed_total
                         )
-                        print(f"[{datetime.now().isoformat()}] AGUARDANDO MENSAGENS: Task {task_id} retornou status 200 mas não contém mensagens. Aguardando {self.retry_delay}s para nova tentativa.")
-                        
-                        # Incrementar contador de tentativas
-                        retries += 1
                         
                         # Verificar se atingimos o limite de tentativas
                         if retries >= self.max_retries:
@@ -347,53 +977,54 @@ class SalesBuilderStatusChecker:
                                 max_attempts=self.max_retries,
                                 elapsed_total_seconds=elapsed_total
                             )
-                            print(f"[{datetime.now().isoformat()}] MÁXIMO DE TENTATIVAS: {self.max_retries} tentativas de verificação da task {task_id} falharam após {elapsed_total:.2f}s")
                             # Retornar resposta com status_code para acionar o fallback
-                            response_data["status_code"] = response.status_code
+                            response_data["status_code"] = 200
                             return response_data
                         
                         # Aguardar antes da próxima tentativa
-                        await asyncio.sleep(self.retry_delay)
+                        await asyncio.sleep(delay)
                         continue
                 elif response.status_code == 403:
-                    try:
-                        error_data = response.json()
-                        logger.error(
-                            "Erro de autorização",
-                            task_id=task_id,
-                            status_code=response.status_code,
-                            error_details=error_data,
-                            elapsed_total_seconds=elapsed_total
-                        )
-                    except:
-                        logger.error(
-                            "Erro de autorização",
-                            task_id=task_id,
-                            status_code=response.status_code,
-                            response_text=response.text,
-                            elapsed_total_seconds=elapsed_total
-                        )
-                    print(f"[{datetime.now().isoformat()}] ERRO DE AUTORIZAÇÃO: Status 403 ao verificar task {task_id}")
+                    # Erro de autorização: o corpo é registrado sem tentar interpretá-lo como JSON
+                    logger.error(
+                        "Erro de autorização",
+                        task_id=task_id,
+                        status_code=response.status_code,
+                        response_text=response.text[:200],
+                        elapsed_total_seconds=elapsed_total
+                    )
                     return {"error": f"{response.status_code}: Erro de autorização", "task_id": task_id}
                 else:
-                    try:
-                        error_data = response.json()
+                    # Interpretar o corpo como JSON apenas quando o content-type indicar
+                    if "json" in response.headers.get("content-type", ""):
                         logger.warning(
                             "Resposta inesperada da API",
                             task_id=task_id,
                             status_code=response.status_code,
-                            error_details=error_data,
+                            error_details=orjson.loads(response.content),
                             elapsed_total_seconds=elapsed_total
                         )
-                    except:
+                    else:
                         logger.warning(
                             "Resposta inesperada da API",
                             task_id=task_id,
                             status_code=response.status_code,
-                            response_text=response.text,
+                            response_text=response.text[:200],
                             elapsed_total_seconds=elapsed_total
                         )
-                    print(f"[{datetime.now().isoformat()}] RESPOSTA INESPERADA: Status {response.status_code} ao verificar task {task_id}")
+                    
+                    # Status inesperado também conta como tentativa
+                    retries += 1
+                    if retries >= self.max_retries:
+                        logger.error(
+                            "Número máximo de tentativas excedido após respostas inesperadas",
+                            task_id=task_id,
+                            max_attempts=self.max_retries,
+                            status_code=response.status_code,
+                            elapsed_total_seconds=elapsed_total
+                        )
+                        return {"error": f"{response.status_code}: Resposta inesperada da API", "task_id": task_id}
+                    await asyncio.sleep(self._retry_delay(retries))
                 
             except httpx.TimeoutException:
                 elapsed_total = (datetime.utcnow() - start_time_total).total_seconds()
@@ -407,17 +1038,16 @@ class SalesBuilderStatusChecker:
                 )
                 retries += 1
                 if retries < self.max_retries:
-                    print(f"[{datetime.now().isoformat()}] TIMEOUT: Tentativa {retries}/{self.max_retries} falhou após {self.timeout}s. Aguardando {self.retry_delay}s para nova tentativa. Tempo total: {elapsed_total:.2f}s")
+                    delay = self._retry_delay(retries)
                     logger.info(
                         "Aguardando para nova tentativa",
                         task_id=task_id,
-                        retry_delay_seconds=self.retry_delay,
+                        retry_delay_seconds=delay,
                         current_retry=retries,
                         elapsed_total_seconds=elapsed_total
                     )
-                    await asyncio.sleep(self.retry_delay)
+                    await asyncio.sleep(delay)
                 else:
-                    print(f"[{datetime.now().isoformat()}] MÁXIMO DE TENTATIVAS: {self.max_retries} tentativas de verificação da task {task_id} falharam após {elapsed_total:.2f}s")
                     logger.error(
                         "Número máximo de tentativas excedido",
                         task_id=task_id,
@@ -439,17 +1069,16 @@ class SalesBuilderStatusChecker:
                 )
                 retries += 1
                 if retries < self.max_retries:
-                    print(f"[{datetime.now().isoformat()}] ERRO DE REQUISIÇÃO: {str(e)}. Tentativa {retries}/{self.max_retries}. Aguardando {self.retry_delay}s para nova tentativa. Tempo total: {elapsed_total:.2f}s")
+                    delay = self._retry_delay(retries)
                     logger.info(
                         "Aguardando para nova tentativa após erro de requisição",
                         task_id=task_id,
-                        retry_delay_seconds=self.retry_delay,
+                        retry_delay_seconds=delay,
                         current_retry=retries,
                         elapsed_total_seconds=elapsed_total
                     )
-                    await asyncio.sleep(self.retry_delay)
+                    await asyncio.sleep(delay)
                 else:
-                    print(f"[{datetime.now().isoformat()}] MÁXIMO DE TENTATIVAS: {self.max_retries} tentativas de verificação da task {task_id} falharam com erro de requisição após {elapsed_total:.2f}s")
                     logger.error(
                         "Número máximo de tentativas excedido após erros de requisição",
                         task_id=task_id,
@@ -472,17 +1101,16 @@ class SalesBuilderStatusChecker:
                 )
                 retries += 1
                 if retries < self.max_retries:
-                    print(f"[{datetime.now().isoformat()}] EXCEÇÃO INESPERADA: {str(e)}. Tentativa {retries}/{self.max_retries}. Aguardando {self.retry_delay}s para nova tentativa. Tempo total: {elapsed_total:.2f}s")
+                    delay = self._retry_delay(retries)
                     logger.info(
                         "Aguardando para nova tentativa após exceção",
                         task_id=task_id,
-                        retry_delay_seconds=self.retry_delay,
+                        retry_delay_seconds=delay,
                         current_retry=retries,
                         elapsed_total_seconds=elapsed_total
                     )
-                    await asyncio.sleep(self.retry_delay)
+                    await asyncio.sleep(delay)
                 else:
-                    print(f"[{datetime.now().isoformat()}] MÁXIMO DE TENTATIVAS: {self.max_retries} tentativas de verificação da task {task_id} falharam com exceção inesperada após {elapsed_total:.2f}s")
                     logger.error(
                         "Número máximo de tentativas excedido após exceções",
                         task_id=task_id,
@@ -495,135 +1123,93 @@ class SalesBuilderStatusChecker:
         # Este código não deve ser alcançado devido aos retornos nos blocos de exceção
         return {"error": "Falha ao verificar status da task após múltiplas tentativas", "task_id": task_id}
     
-    async def insert_chat_history(self, whatsapp: str, message: str, task_data: Dict[str, Any]) -> Dict:
+    async def _ensure_mongodb(self) -> Optional[Dict[str, str]]:
+        """
+        Garante que a conexão com o MongoDB esteja inicializada.
+        
+        Returns:
+            None se o MongoDB estiver disponível, ou Dict com aviso/erro caso contrário
         """
-        Insere o histórico de mensagens no MongoDB.
+        # Verificar se temos acesso ao MongoDB
+        if getattr(self, 'mongodb', None) is not None:
+            return None
+        
+        # Tentar obter configurações do MongoDB de diferentes fontes
+        mongo_uri = None
+        db_name = None
+        
+        # 1. Verificar se as configurações estão disponíveis no objeto settings
+        if self.settings:
+            if hasattr(self.settings, 'MONGO_URI'):
+                mongo_uri = self.settings.MONGO_URI
+            if hasattr(self.settings, 'DB_NAME'):
+                db_name = self.settings.DB_NAME
+        
+        # 2. Se não encontrou nas configurações, tentar variáveis de ambiente
+        if not mongo_uri:
+            mongo_uri = _ENV_MONGO_URI
+        if not db_name:
+            db_name = _ENV_DB_NAME
+        
+        # Verificar se temos as informações necessárias
+        if not mongo_uri or not db_name:
+            logger.warning("Configurações do MongoDB não disponíveis. Histórico não será salvo.")
+            return {"warning": "MongoDB não configurado. Histórico não foi salvo."}
+        
+        # Inicializar conexão com MongoDB
+        try:
+            logger.info(
+                "Inicializando conexão com MongoDB",
+                mongo_uri_masked=f"{mongo_uri[:15]}...{mongo_uri[-5:]}" if len(mongo_uri) > 20 else "***",
+                db_name=db_name
+            )
+            self.mongodb_client = await _get_mongo_client(mongo_uri)
+            self.mongodb = self.mongodb_client[db_name]
+        except Exception as e:
+            logger.error(
+                "Erro ao conectar ao MongoDB",
+                error=str(e),
+                error_type=type(e).__name__
+            )
+            return {"error": f"Falha ao conectar ao MongoDB: {str(e)}"}
+        return None
+    
+    async def insert_chat_histories_bulk(self, docs: List[Dict[str, Any]]) -> Dict:
+        """
+        Insere vários documentos de histórico de chat no MongoDB em uma única operação.
         
         Args:
-            whatsapp: Número de WhatsApp do destinatário
-            message: Mensagem enviada
-            task_data: Dados da task do Sales Builder
+            docs: Documentos montados com _build_history_doc
             
         Returns:
-            Dict com ID do documento inserido ou erro
+            Dict com os IDs dos documentos inseridos ou erro
         """
+        if not docs:
+            return {"inserted_ids": []}
+        
         try:
-            # Verificar se temos acesso ao MongoDB
-            mongodb_initialized = hasattr(self, 'mongodb') and self.mongodb is not None
-            if not mongodb_initialized:
-                # Tentar obter configurações do MongoDB de diferentes fontes
-                mongo_uri = None
-                db_name = None
-                
-                # 1. Verificar se as configurações estão disponíveis no objeto settings
-                if self.settings:
-                    if hasattr(self.settings, 'MONGO_URI'):
-                        mongo_uri = self.settings.MONGO_URI
-                    if hasattr(self.settings, 'DB_NAME'):
-                        db_name = self.settings.DB_NAME
-                
-                # 2. Se não encontrou nas configurações, tentar variáveis de ambiente
-                if not mongo_uri:
-                    mongo_uri = os.getenv('MONGO_URI')
-                if not db_name:
-                    db_name = os.getenv('DB_NAME')
-                
-                # Verificar se temos as informações necessárias
-                if not mongo_uri or not db_name:
-                    logger.warning(
-                        "Configurações do MongoDB não disponíveis. Histórico não será salvo.",
-                        whatsapp=whatsapp,
-                        message_preview=message[:50] + "..." if len(message) > 50 else message
-                    )
-                    print(f"[{datetime.now().isoformat()}] AVISO: Configurações do MongoDB não disponíveis. Histórico não será salvo.")
-                    return {"warning": "MongoDB não configurado. Histórico não foi salvo."}
-                
-                # Inicializar conexão com MongoDB
-                try:
-                    logger.info(
-                        "Inicializando conexão com MongoDB",
-                        mongo_uri_masked=f"{mongo_uri[:15]}...{mongo_uri[-5:]}" if len(mongo_uri) > 20 else "***",
-                        db_name=db_name
-                    )
-                    self.mongodb_client = AsyncIOMotorClient(mongo_uri)
-                    self.mongodb = self.mongodb_client[db_name]
-                except Exception as e:
-                    logger.error(
-                        "Erro ao conectar ao MongoDB",
-                        error=str(e),
-                        error_type=type(e).__name__
-                    )
-                    print(f"[{datetime.now().isoformat()}] ERRO DE CONEXÃO: Falha ao conectar ao MongoDB: {str(e)}")
-                    return {"error": f"Falha ao conectar ao MongoDB: {str(e)}"}
-            
-            # Extrair dados relevantes da task
-            result = task_data.get("result", {})
-            
-            # Converter UTC para São Paulo (UTC-3)
-            TIMEZONE_SP = pytz.timezone('America/Sao_Paulo')
-            data_hora_sp = datetime.now(timezone.utc).astimezone(TIMEZONE_SP)
+            status = await self._ensure_mongodb()
+            if status:
+                return status
             
-            # Preparar documento para inserção
-            document = {
-                'session_id': whatsapp,
-                'status': result.get('status', ''),
-                'data_hora': data_hora_sp.isoformat(),  # Horário de São Paulo
-                'p_atual': result.get('p_atual', ''),
-                'p_proxima': result.get('p_proxima', ''),
-                'interacao': result.get('interacao', ''),
-                'tipo_interacao': result.get('tipo_interacao', 'whatsapp'),
-                'msg_resposta': [message],  # Mensagem que acabou de ser enviada
-                'periodo_agendamento': result.get('periodo_agendamento', ''),
-                'horario_agendamento': result.get('horario_agendamento', ''),
-                'dia_agendamento': result.get('dia_agendamento', ''),
-                'link_agendamento_google_calendar': result.get('link_agendamento_google_calendar', 'NULL'),
-                'link_meet_google': result.get('link_meet_google', 'NULL')
-            }
+            # ordered=False: uma falha em um documento não impede a inserção dos demais
+            result = await self.mongodb.sdr_chat_histories.insert_many(docs, ordered=False)
+            inserted_ids = [str(inserted_id) for inserted_id in _result_field(result, "inserted_ids")]
             
-            # Log para depuração
             logger.info(
-                "Inserindo histórico de chat no MongoDB",
-                session_id=whatsapp,
-                message_preview=message[:50] + "..." if len(message) > 50 else message
+                "Históricos de chat inseridos com sucesso",
+                session_id=docs[0].get('session_id'),
+                document_count=len(inserted_ids)
             )
-            print(f"[{datetime.now().isoformat()}] INSERINDO HISTÓRICO: Salvando mensagem para {whatsapp} no MongoDB")
-            
-            # Inserir documento na collection sdr_chat_histories
-            try:
-                result = await self.mongodb.sdr_chat_histories.insert_one(document)
-                
-                # Log de sucesso
-                logger.info(
-                    "Histórico de chat inserido com sucesso",
-                    session_id=whatsapp,
-                    document_id=str(result.inserted_id)
-                )
-                print(f"[{datetime.now().isoformat()}] HISTÓRICO SALVO: ID do documento {str(result.inserted_id)}")
-                
-                return {"inserted_id": str(result.inserted_id)}
-            except Exception as e:
-                logger.error(
-                    "Erro ao inserir documento no MongoDB",
-                    error=str(e),
-                    error_type=type(e).__name__,
-                    whatsapp=whatsapp
-                )
-                print(f"[{datetime.now().isoformat()}] ERRO AO INSERIR: Falha ao salvar histórico no MongoDB: {str(e)}")
-                return {"error": f"Falha ao inserir documento: {str(e)}"}
-            
+            return {"inserted_ids": inserted_ids}
         except Exception as e:
-            # Log de erro
             logger.error(
-                "Erro ao inserir histórico de chat",
+                "Erro ao inserir históricos de chat no MongoDB",
                 error=str(e),
                 error_type=type(e).__name__,
-                whatsapp=whatsapp
+                document_count=len(docs)
             )
-            print(f"[{datetime.now().isoformat()}] ERRO AO SALVAR HISTÓRICO: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            
-            return {"error": f"Falha ao inserir histórico: {str(e)}"}
+            return {"error": f"Falha ao inserir históricos: {str(e)}"}
 
     async def process_task_response(self, task_data: Dict[str, Any]) -> bool:
         """
@@ -636,122 +1222,73 @@ class SalesBuilderStatusChecker:
             bool: True se o processamento foi bem-sucedido, False caso contrário
         """
         try:
-            # Verificar se há erro na resposta
-            if "error" in task_data:
-                logger.error(f"Erro na resposta da API: {task_data.get('error')}")
-                print(f"[{datetime.now().isoformat()}] ERRO NA RESPOSTA: {task_data.get('error')}")
+            # Validações sem I/O primeiro; envio e persistência depois
+            validated = _validate_task(task_data)
+            if validated is None:
                 return False
-                
+            whatsapp, messages = validated
+            
             # Verificar se a Evolution API está configurada
-            if not hasattr(self.evo_api, 'is_configured') or not self.evo_api.is_configured:
+            if not self._evo_ok:
                 logger.warning("Evolution API não está configurada corretamente. Não é possível enviar mensagens.")
-                print(f"[{datetime.now().isoformat()}] CONFIGURAÇÃO INCOMPLETA: Evolution API não está configurada corretamente")
-                return False
-                
-            # Extrair dados da task
-            task_id = task_data.get("task_id")
-            result = task_data.get("result", {})
-            
-            # Verificar se temos os dados necessários
-            if not task_id or not result:
-                logger.error(f"Dados incompletos na task: {task_data}")
-                print(f"[{datetime.now().isoformat()}] DADOS INCOMPLETOS: Faltam informações na resposta da task {task_id}")
                 return False
             
-            # Extrair o número de WhatsApp e as mensagens
-            whatsapp = result.get("whatsapp_prospect")
-            messages = result.get("msg_resposta", [])
+            task_id = task_data["task_id"]
+            logger.debug("Iniciando envio de mensagens", task_id=task_id, whatsapp=whatsapp, message_count=len(messages))
             
-            # Fallback: Se a task retornou 200 e msg_resposta está vazia, usar mensagens padrão
-            if task_data.get("status_code") == 200 and isinstance(messages, list) and len(messages) == 0:
-                logger.info("Task retornou 200 com lista de mensagens vazia. Usando mensagens padrão de fallback.")
-                print(f"[{datetime.now().isoformat()}] FALLBACK: Task retornou 200 com msg_resposta vazia. Usando mensagens padrão.")
-                messages = [
-                    "Oi, tudo bem? Aqui é o Vagner Campos, fundador da Arduus. Vi seu interesse em inovação e transformação digital no LinkedIn, especialmente na área de IA.",
-                    "Percebi que você entrou em contato conosco para conhecer mais sobre nossas soluções de IA generativa. Gostaria de saber mais sobre como podemos impulsionar sua transformação digital?"
-                ]
+            # Enviar as mensagens válidas uma a uma, na ordem da lista: elas formam uma
+            # conversa, e cada payload tem um delay proporcional ao tamanho do texto, então
+            # envios concorrentes podem chegar fora de ordem no WhatsApp
+            # Entradas vazias ou que não são texto não são enviadas e contam como falha
+            sent_messages = []
+            for i, message in enumerate(messages, 1):
+                if not message or not isinstance(message, str):
+                    logger.warning("Mensagem inválida ignorada", whatsapp=whatsapp, index=i)
+                    continue
+                logger.debug("Enviando mensagem", whatsapp=whatsapp, index=i, total=len(messages))
                 
-                # Atualizar o task_data com as mensagens de fallback para que sejam armazenadas na fila
-                if "result" in task_data:
-                    task_data["result"]["msg_resposta"] = messages
-                    task_data["fallback_messages_used"] = True
-            elif not messages:
-                logger.error(f"Dados incompletos na task: {task_data}")
-                print(f"[{datetime.now().isoformat()}] DADOS INCOMPLETOS: Faltam mensagens na task {task_id}")
-                return False
-            
-            if not whatsapp:
-                logger.error(f"Dados incompletos na task: {task_data}")
-                print(f"[{datetime.now().isoformat()}] DADOS INCOMPLETOS: Falta número de WhatsApp na task {task_id}")
-                return False
-            
-            # Verificar se o número de WhatsApp está em um formato válido
-            if not whatsapp.isdigit():
-                logger.warning(f"Número de WhatsApp inválido: {whatsapp}. Tentando limpar...")
-                print(f"[{datetime.now().isoformat()}] NÚMERO INVÁLIDO: Tentando limpar o número {whatsapp}")
-                # Tentar limpar o número
-                whatsapp = re.sub(r'\D', '', whatsapp)
-                if not whatsapp.isdigit():
-                    logger.error(f"Número de WhatsApp ainda inválido após limpeza: {whatsapp}")
-                    print(f"[{datetime.now().isoformat()}] NÚMERO INVÁLIDO: Número {whatsapp} ainda inválido após limpeza")
-                    return False
-            
-            # Log no console antes de enviar mensagens
-            print(f"[{datetime.now().isoformat()}] INICIANDO ENVIO: Preparando para enviar {len(messages)} mensagens para {whatsapp}")
+                # Uma falha conta apenas para esta mensagem; as seguintes continuam sendo enviadas
+                try:
+                    async with _SEND_SEMAPHORE:
+                        result_send = await self.evo_api.send_text_message_async(
+                            number=whatsapp,
+                            text=message
+                        )
+                except Exception as e:
+                    logger.error(f"Erro ao enviar mensagem para {whatsapp}: {str(e)}", index=i, exc_info=True)
+                    continue
+                
+                # Verificar se o resultado indica erro
+                if isinstance(result_send, dict) and result_send.get("status") == "error":
+                    error_message = result_send.get('message', 'Erro desconhecido')
+                    logger.error(f"Erro ao enviar mensagem para {whatsapp}: {error_message}", index=i)
+                    continue
+                
+                logger.info("Mensagem enviada", whatsapp=whatsapp, index=i, message_head=message[:50], message_len=len(message))
+                sent_messages.append(message)
             
-            # Rastrear o sucesso do envio de mensagens
-            all_messages_sent_successfully = True
-            successful_messages_count = 0
+            successful_messages_count = len(sent_messages)
+            all_messages_sent_successfully = successful_messages_count == len(messages)
             
-            # Enviar cada mensagem para o WhatsApp
-            for i, message in enumerate(messages, 1):
-                if message and isinstance(message, str):
-                    # Log no console antes de enviar cada mensagem
-                    print(f"[{datetime.now().isoformat()}] ENVIANDO MENSAGEM {i}/{len(messages)}: Para {whatsapp} - '{message[:50]}...'")
-                    
-                    # Enviar mensagem e capturar o resultado
-                    result_send = self.evo_api.send_text_message(
-                        number=whatsapp,
-                        text=message
-                    )
-                    
-                    # Verificar se o resultado indica erro
-                    if isinstance(result_send, dict) and result_send.get("status") == "error":
-                        error_message = result_send.get('message', 'Erro desconhecido')
-                        logger.error(f"Erro ao enviar mensagem para {whatsapp}: {error_message}")
-                        print(f"[{datetime.now().isoformat()}] ERRO AO ENVIAR MENSAGEM: {error_message}")
-                        all_messages_sent_successfully = False
-                        # Continuar tentando enviar as próximas mensagens
-                        continue
-                    
-                    # Log no console após enviar cada mensagem com sucesso
-                    print(f"[{datetime.now().isoformat()}] MENSAGEM ENVIADA {i}/{len(messages)}: Para {whatsapp}")
-                    successful_messages_count += 1
-                    
-                    # Inserir histórico de chat no MongoDB
-                    await self.insert_chat_history(whatsapp, message, task_data)
-                    
-                    logger.info(f"Mensagem enviada para {whatsapp}: {message[:50]}...")
+            # Enfileirar o histórico das mensagens enviadas; a gravação no MongoDB
+            # acontece em lote, fora do caminho de envio
+            self._enqueue_history(
+                [_build_history_doc(whatsapp, msg, task_data) for msg in sent_messages]
+            )
             
-            # Log no console após tentar enviar todas as mensagens
             if all_messages_sent_successfully:
-                print(f"[{datetime.now().isoformat()}] ENVIO CONCLUÍDO: Todas as {len(messages)} mensagens foram enviadas para {whatsapp}")
                 logger.info(f"Processamento da task {task_id} concluído com sucesso")
                 return True
             else:
-                print(f"[{datetime.now().isoformat()}] ENVIO PARCIAL: Apenas {successful_messages_count} de {len(messages)} mensagens foram enviadas para {whatsapp}")
                 logger.warning(f"Processamento da task {task_id} concluído parcialmente. Apenas {successful_messages_count} de {len(messages)} mensagens foram enviadas.")
                 return False
             
         except Exception as e:
-            logger.error(f"Erro ao processar resposta da task: {str(e)}")
-            print(f"[{datetime.now().isoformat()}] ERRO NO PROCESSAMENTO: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            print(f"[{datetime.now().isoformat()}] TRACEBACK: {traceback.format_exc()}")
+            logger.error(f"Erro ao processar resposta da task: {str(e)}", exc_info=True)
             return False
     
-    async def check_and_process_task(self, task_id: str, request_queue=None, request_id=None) -> bool:
+    async def check_and_process_task(self, task_id: str, request_queue=None, request_id=None,
+                                     progress: Optional[RequestProgress] = None) -> bool:
         """
         Verifica o status de uma task e processa a resposta.
         
@@ -759,6 +1296,8 @@ class SalesBuilderStatusChecker:
             task_id: ID da task a ser verificada e processada
             request_queue: Referência à coleção de fila de requisições (opcional)
             request_id: ID da requisição na fila (opcional)
+            progress: Acumulador de passos do chamador (opcional); quando omitido,
+                os passos são gravados na fila ao final desta chamada
             
         Returns:
             bool: True se o processamento foi bem-sucedido, False caso contrário
@@ -768,6 +1307,10 @@ class SalesBuilderStatusChecker:
             task_id=task_id
         )
         
+        owns_progress = progress is None
+        if owns_progress:
+            progress = RequestProgress(request_queue, request_id)
+        
         start_time = datetime.utcnow()
         
         try:
@@ -775,39 +1318,28 @@ class SalesBuilderStatusChecker:
             task_data = await self.check_task_status(task_id)
             
             if not task_data:
+                now = datetime.utcnow()
                 logger.error(
                     "Não foi possível obter dados da task",
                     task_id=task_id,
-                    elapsed_time_seconds=(datetime.utcnow() - start_time).total_seconds()
+                    elapsed_time_seconds=(now - start_time).total_seconds()
                 )
                 
-                # Atualizar status na fila se disponível
-                if request_queue is not None and request_id is not None:
-                    await request_queue.update_one(
-                        {"_id": ObjectId(request_id)},
-                        {
-                            "$set": {"status": "task_check_failed"},
-                            "$push": {
-                                "steps": {
-                                    "step": "task_check_failed",
-                                    "timestamp": datetime.utcnow(),
-                                    "success": False,
-                                    "message": "Não foi possível obter dados da task"
-                                }
-                            }
-                        }
-                    )
-                
+                progress.record_step(
+                    "task_check_failed", False, "Não foi possível obter dados da task",
+                    status="task_check_failed", timestamp=now
+                )
                 return False
             
             # Verificar se há erro na resposta
             if "error" in task_data:
                 error_message = task_data.get('error', 'Erro desconhecido')
+                now = datetime.utcnow()
                 logger.error(
                     "Erro ao verificar status da task",
                     task_id=task_id,
                     error=error_message,
-                    elapsed_time_seconds=(datetime.utcnow() - start_time).total_seconds()
+                    elapsed_time_seconds=(now - start_time).total_seconds()
                 )
                 
                 # Verificar se é um erro de autorização (403) e tentar atualizar a chave de API
@@ -818,108 +1350,66 @@ class SalesBuilderStatusChecker:
                     )
                     
                     # Tentar obter uma chave de API alternativa do .env
-                    alt_api_key = os.getenv("SALES_BUILDER_API_KEY_ALT")
+                    alt_api_key = _ENV_SALES_BUILDER_KEY_ALT
                     if alt_api_key:
                         logger.info(
                             "Chave de API alternativa encontrada. Tentando novamente.",
                             task_id=task_id
                         )
                         
-                        # Atualizar a chave de API do verificador
-                        self.api_key = alt_api_key
-                        self.headers["Authorization"] = f"Bearer {alt_api_key}"
+                        # Usar a chave alternativa apenas nesta nova verificação: o verificador é
+                        # compartilhado entre as tasks e continua com a chave configurada
+                        alt_headers = {**self.headers, "Authorization": f"Bearer {alt_api_key}"}
                         
-                        # Recriar o cliente HTTP com os novos headers
-                        await self.client.aclose()
-                        self.client = httpx.AsyncClient(
-                            timeout=self.timeout,
-                            headers=self.headers
-                        )
+                        # Gravar os passos pendentes antes de uma nova verificação potencialmente longa
+                        await progress.flush()
                         
                         # Tentar verificar o status novamente
                         logger.info(
                             "Tentando verificar status novamente com a nova chave de API",
                             task_id=task_id
                         )
-                        task_data = await self.check_task_status(task_id)
+                        task_data = await self.check_task_status(task_id, headers=alt_headers)
                         
                         if "error" in task_data:
+                            # Nova verificação concluída: o horário anterior não vale mais
+                            now = datetime.utcnow()
                             logger.error(
                                 "Falha mesmo após atualizar a chave de API",
                                 task_id=task_id,
                                 error=task_data.get('error'),
-                                elapsed_time_seconds=(datetime.utcnow() - start_time).total_seconds()
+                                elapsed_time_seconds=(now - start_time).total_seconds()
                             )
                             
-                            # Atualizar status na fila se disponível
-                            if request_queue is not None and request_id is not None:
-                                await request_queue.update_one(
-                                    {"_id": ObjectId(request_id)},
-                                    {
-                                        "$set": {"status": "api_key_error"},
-                                        "$push": {
-                                            "steps": {
-                                                "step": "api_key_error",
-                                                "timestamp": datetime.utcnow(),
-                                                "success": False,
-                                                "message": f"Erro de autorização persistente: {task_data.get('error')}"
-                                            }
-                                        }
-                                    }
-                                )
-                            
+                            progress.record_step(
+                                "api_key_error", False,
+                                f"Erro de autorização persistente: {task_data.get('error')}",
+                                status="api_key_error", timestamp=now
+                            )
                             return False
                     else:
                         logger.error(
                             "Não foi possível encontrar uma chave de API alternativa no .env",
                             task_id=task_id,
-                            elapsed_time_seconds=(datetime.utcnow() - start_time).total_seconds()
+                            elapsed_time_seconds=(now - start_time).total_seconds()
                         )
                         
-                        # Atualizar status na fila se disponível
-                        if request_queue is not None and request_id is not None:
-                            await request_queue.update_one(
-                                {"_id": ObjectId(request_id)},
-                                {
-                                    "$set": {"status": "api_key_error"},
-                                    "$push": {
-                                        "steps": {
-                                            "step": "api_key_error",
-                                            "timestamp": datetime.utcnow(),
-                                            "success": False,
-                                            "message": "Não foi possível encontrar uma chave de API alternativa"
-                                        }
-                                    }
-                                }
-                            )
-                        
+                        progress.record_step(
+                            "api_key_error", False, "Não foi possível encontrar uma chave de API alternativa",
+                            status="api_key_error", timestamp=now
+                        )
                         return False
                 else:
-                    # Atualizar status na fila se disponível
-                    if request_queue is not None and request_id is not None:
-                        await request_queue.update_one(
-                            {"_id": ObjectId(request_id)},
-                            {
-                                "$set": {"status": "task_check_error"},
-                                "$push": {
-                                    "steps": {
-                                        "step": "task_check_error",
-                                        "timestamp": datetime.utcnow(),
-                                        "success": False,
-                                        "message": f"Erro ao verificar status: {error_message}"
-                                    }
-                                }
-                            }
-                        )
-                    
+                    progress.record_step(
+                        "task_check_error", False, f"Erro ao verificar status: {error_message}",
+                        status="task_check_error", timestamp=now
+                    )
                     return False
             
             # Armazenar a msg_resposta na tabela da fila de processamento se disponível
-            if request_queue is not None and request_id is not None and "result" in task_data and task_data["result"]:
+            if progress.enabled:
                 # Extrair as mensagens da resposta
-                messages = []
-                if "msg_resposta" in task_data["result"] and task_data["result"]["msg_resposta"]:
-                    messages = task_data["result"]["msg_resposta"]
+                _, messages = _extract_result_and_msgs(task_data)
                 
                 # Atualizar a fila com as mensagens
                 if messages:
@@ -929,76 +1419,32 @@ class SalesBuilderStatusChecker:
                         request_id=request_id,
                         message_count=len(messages)
                     )
-                    print(f"[{datetime.now().isoformat()}] ARMAZENANDO MENSAGENS: Salvando {len(messages)} mensagens na fila para o task_id {task_id}")
                     
-                    try:
-                        await request_queue.update_one(
-                            {"_id": ObjectId(request_id)},
-                            {
-                                "$set": {
-                                    "messages": messages,
-                                    "message_count": len(messages)
-                                },
-                                "$push": {
-                                    "steps": {
-                                        "step": "messages_stored",
-                                        "timestamp": datetime.utcnow(),
-                                        "success": True,
-                                        "message": f"Armazenadas {len(messages)} mensagens da resposta",
-                                        "message_preview": messages[0][:50] + "..." if len(messages[0]) > 50 else messages[0]
-                                    }
-                                }
-                            }
-                        )
-                    except Exception as e:
-                        logger.error(
-                            "Erro ao armazenar mensagens na fila",
-                            task_id=task_id,
-                            request_id=request_id,
-                            error=str(e),
-                            error_type=type(e).__name__
-                        )
-                        print(f"[{datetime.now().isoformat()}] ERRO AO ARMAZENAR MENSAGENS: {str(e)}")
+                    progress.set_fields(messages=messages)
+                    # Contagem calculada no MongoDB a partir do array gravado
+                    progress.set_computed(message_count={"$size": "$messages"})
+                    progress.record_step(
+                        "messages_stored", True, f"Armazenadas {len(messages)} mensagens da resposta",
+                        message_preview=messages[0][:50] + "..." if len(messages[0]) > 50 else messages[0]
+                    )
             
             # Processar resposta da task
             success = await self.process_task_response(task_data)
             
-            elapsed_time = (datetime.utcnow() - start_time).total_seconds()
+            now = datetime.utcnow()
+            elapsed_time = (now - start_time).total_seconds()
             
             # Atualizar status na fila com base no resultado do processamento
-            if request_queue is not None and request_id is not None:
-                if success:
-                    await request_queue.update_one(
-                        {"_id": ObjectId(request_id)},
-                        {
-                            "$set": {"status": "completed"},
-                            "$push": {
-                                "steps": {
-                                    "step": "messages_sent",
-                                    "timestamp": datetime.utcnow(),
-                                    "success": True,
-                                    "message": f"Todas as mensagens foram enviadas com sucesso",
-                                    "elapsed_time_seconds": elapsed_time
-                                }
-                            }
-                        }
-                    )
-                else:
-                    await request_queue.update_one(
-                        {"_id": ObjectId(request_id)},
-                        {
-                            "$set": {"status": "message_send_failed"},
-                            "$push": {
-                                "steps": {
-                                    "step": "message_send_failed",
-                                    "timestamp": datetime.utcnow(),
-                                    "success": False,
-                                    "message": "Falha ao enviar uma ou mais mensagens",
-                                    "elapsed_time_seconds": elapsed_time
-                                }
-                            }
-                        }
-                    )
+            if success:
+                progress.record_step(
+                    "messages_sent", True, "Todas as mensagens foram enviadas com sucesso",
+                    status="completed", timestamp=now, elapsed_time_seconds=elapsed_time
+                )
+            else:
+                progress.record_step(
+                    "message_send_failed", False, "Falha ao enviar uma ou mais mensagens",
+                    status="message_send_failed", timestamp=now, elapsed_time_seconds=elapsed_time
+                )
             
             logger.info(
                 "Processamento da task concluído",
@@ -1010,7 +1456,8 @@ class SalesBuilderStatusChecker:
             return success
             
         except Exception as e:
-            elapsed_time = (datetime.utcnow() - start_time).total_seconds()
+            now = datetime.utcnow()
+            elapsed_time = (now - start_time).total_seconds()
             logger.error(
                 "Erro ao verificar e processar task",
                 task_id=task_id,
@@ -1020,25 +1467,50 @@ class SalesBuilderStatusChecker:
             )
             
             # Atualizar status na fila em caso de exceção
-            if request_queue is not None and request_id is not None:
-                await request_queue.update_one(
-                    {"_id": ObjectId(request_id)},
-                    {
-                        "$set": {"status": "processing_exception"},
-                        "$push": {
-                            "steps": {
-                                "step": "processing_exception",
-                                "timestamp": datetime.utcnow(),
-                                "success": False,
-                                "message": f"Exceção durante o processamento: {str(e)}",
-                                "elapsed_time_seconds": elapsed_time
-                            }
-                        }
-                    }
-                )
-            
+            progress.record_step(
+                "processing_exception", False, f"Exceção durante o processamento: {str(e)}",
+                status="processing_exception", timestamp=now, elapsed_time_seconds=elapsed_time
+            )
             return False
+        finally:
+            # Gravar os passos acumulados em um único update_one
+            if owns_progress:
+                await progress.flush()
+
+
+# Verificador compartilhado por todas as tasks do processo, criado por get_checker()
+_checker: Optional[SalesBuilderStatusChecker] = None
+
+def get_checker(settings=None) -> SalesBuilderStatusChecker:
+    """
+    Retorna o verificador compartilhado, criando-o na primeira chamada
+    
+    As configurações são usadas apenas na criação; chamadas seguintes
+    reutilizam o mesmo verificador e sua sessão da Evolution API.
+    
+    Args:
+        settings: Configurações da aplicação principal (opcional); se informadas
+            depois da criação e diferentes das usadas nela, são ignoradas com um aviso
+        
+    Returns:
+        SalesBuilderStatusChecker: Verificador compartilhado
+    """
+    global _checker
+    if _checker is None:
+        _checker = SalesBuilderStatusChecker(settings=settings)
+    elif settings is not None and settings != _checker.settings:
+        logger.warning(
+            "Verificador compartilhado já criado com outras configurações; as novas serão ignoradas",
+            created_with_settings=_checker.settings is not None
+        )
+    return _checker
 
+async def close_checker() -> None:
+    """Grava os históricos pendentes e fecha o verificador compartilhado (chamado no encerramento da aplicação)."""
+    global _checker
+    if _checker is not None:
+        checker, _checker = _checker, None
+        await checker.close()
 
 async def process_sales_builder_task(task_id: str, settings=None, request_id=None, mongodb_uri=None, db_name=None) -> bool:
     """
@@ -1061,34 +1533,15 @@ async def process_sales_builder_task(task_id: str, settings=None, request_id=Non
         request_id=request_id
     )
     
-    # Log no console
-    print(f"[{datetime.now().isoformat()}] VERIFICAÇÃO INICIADA: Processando task {task_id} do Sales Builder")
-    
     start_time = datetime.utcnow()
     
     # Inicializar conexão com MongoDB para atualizar a fila se request_id for fornecido
     request_queue = None
     if request_id and mongodb_uri and db_name:
         try:
-            mongodb_client = AsyncIOMotorClient(mongodb_uri)
+            mongodb_client = await _get_mongo_client(mongodb_uri)
             db = mongodb_client[db_name]
             request_queue = db["request_queue"]
-            
-            # Atualizar status na fila
-            await request_queue.update_one(
-                {"_id": ObjectId(request_id)},
-                {
-                    "$set": {"status": "task_processing_started"},
-                    "$push": {
-                        "steps": {
-                            "step": "task_processing_started",
-                            "timestamp": datetime.utcnow(),
-                            "success": True,
-                            "message": "Processamento da task iniciado"
-                        }
-                    }
-                }
-            )
         except Exception as e:
             logger.error(
                 "Erro ao conectar ao MongoDB para atualizar fila",
@@ -1097,30 +1550,29 @@ async def process_sales_builder_task(task_id: str, settings=None, request_id=Non
                 request_id=request_id
             )
     
-    # Criar o verificador com as configurações fornecidas
-    checker = SalesBuilderStatusChecker(settings=settings)
+    # Passos da requisição na fila, gravados em lote
+    progress = RequestProgress(request_queue, request_id)
+    progress.record_step(
+        "task_processing_started", True, "Processamento da task iniciado",
+        status="task_processing_started"
+    )
+    
     try:
-        # Atualizar status na fila
-        if request_queue is not None and request_id is not None:
-            await request_queue.update_one(
-                {"_id": ObjectId(request_id)},
-                {
-                    "$set": {"status": "checking_task_status"},
-                    "$push": {
-                        "steps": {
-                            "step": "checking_task_status",
-                            "timestamp": datetime.utcnow(),
-                            "success": True,
-                            "message": "Verificando status da task"
-                        }
-                    }
-                }
-            )
+        # Verificador compartilhado entre as tasks; não é fechado ao final de cada uma
+        checker = get_checker(settings)
+        
+        progress.record_step(
+            "checking_task_status", True, "Verificando status da task",
+            status="checking_task_status"
+        )
+        # A verificação pode levar minutos: gravar o início antes de começar
+        await progress.flush()
         
         # Chamar check_and_process_task com os parâmetros da fila
-        result = await checker.check_and_process_task(task_id, request_queue, request_id)
+        result = await checker.check_and_process_task(task_id, request_queue, request_id, progress=progress)
         
-        elapsed_time = (datetime.utcnow() - start_time).total_seconds()
+        now = datetime.utcnow()
+        elapsed_time = (now - start_time).total_seconds()
         logger.info(
             "Processamento de task do Sales Builder concluído",
             task_id=task_id,
@@ -1129,30 +1581,18 @@ async def process_sales_builder_task(task_id: str, settings=None, request_id=Non
             request_id=request_id
         )
         
-        # Log no console
-        print(f"[{datetime.now().isoformat()}] VERIFICAÇÃO CONCLUÍDA: Task {task_id} processada {'com sucesso' if result else 'com falha'} em {elapsed_time:.2f} segundos")
-        
         # Atualizar status na fila
-        if request_queue is not None and request_id is not None:
-            await request_queue.update_one(
-                {"_id": ObjectId(request_id)},
-                {
-                    "$set": {"status": "task_processing_completed", "task_result": result},
-                    "$push": {
-                        "steps": {
-                            "step": "task_processing_completed",
-                            "timestamp": datetime.utcnow(),
-                            "success": result,
-                            "message": f"Processamento da task concluído {'com sucesso' if result else 'com falha'}",
-                            "elapsed_time_seconds": elapsed_time
-                        }
-                    }
-                }
-            )
+        progress.set_fields(task_result=result)
+        progress.record_step(
+            "task_processing_completed", result,
+            f"Processamento da task concluído {'com sucesso' if result else 'com falha'}",
+            status="task_processing_completed", timestamp=now, elapsed_time_seconds=elapsed_time
+        )
         
         return result
     except Exception as e:
-        elapsed_time = (datetime.utcnow() - start_time).total_seconds()
+        now = datetime.utcnow()
+        elapsed_time = (now - start_time).total_seconds()
         logger.error(
             "Erro durante o processamento de task do Sales Builder",
             task_id=task_id,
@@ -1162,35 +1602,17 @@ async def process_sales_builder_task(task_id: str, settings=None, request_id=Non
             request_id=request_id
         )
         
-        # Log no console
-        print(f"[{datetime.now().isoformat()}] ERRO NA VERIFICAÇÃO: Falha ao processar task {task_id}: {str(e)}")
-        
         # Atualizar status na fila
-        if request_queue is not None:
-            await request_queue.update_one(
-                {"_id": ObjectId(request_id)},
-                {
-                    "$set": {"status": "task_processing_error"},
-                    "$push": {
-                        "steps": {
-                            "step": "task_processing_error",
-                            "timestamp": datetime.utcnow(),
-                            "success": False,
-                            "message": f"Erro durante o processamento: {str(e)}",
-                            "error_type": type(e).__name__,
-                            "elapsed_time_seconds": elapsed_time
-                        }
-                    }
-                }
-            )
+        progress.record_step(
+            "task_processing_error", False, f"Erro durante o processamento: {str(e)}",
+            status="task_processing_error", timestamp=now, error_type=type(e).__name__,
+            elapsed_time_seconds=elapsed_time
+        )
         
         return False
     finally:
-        await checker.close()
-        
-        # Fechar conexão com MongoDB
-        if request_queue is not None and 'mongodb_client' in locals():
-            mongodb_client.close()
+        # Gravar os passos acumulados da task em um único update_one
+        await progress.flush()
 
 
 # Exemplo de uso
@@ -1202,7 +1624,10 @@ if __name__ == "__main__":
     task_id = sys.argv[1]
     
     async def main():
-        success = await process_sales_builder_task(task_id)
+        try:
+            success = await process_sales_builder_task(task_id)
+        finally:
+            await close_checker()
         if success:
             print(f"Task {task_id} processada com sucesso")
         else:
@@ -1,61 +1,89 @@
-import unittest
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+import responses
 from evo_api_v2 import EvolutionAPI
-import os
-from dotenv import load_dotenv
-
-class TestEvolutionAPI(unittest.TestCase):
-    def setUp(self):
-        """Configuração inicial para cada teste"""
-        load_dotenv()
-        self.api = EvolutionAPI()
-        self.test_number = "5524999887888"
-        
-    def test_send_text_message(self):
+
+"""
+Testes da Evolution API
+
+As chamadas HTTP são interceptadas com a biblioteca responses, então os testes
+validam o formato das requisições e o tratamento das respostas sem acessar a rede.
+"""
+
+logger = logging.getLogger(__name__)
+
+TEST_SUBDOMAIN = "evo.test"
+TEST_INSTANCE = "instancia-teste"
+TEST_TOKEN = "token-teste"
+
+@pytest.fixture(scope="class")
+def api():
+    """
+    Instância da EvolutionAPI configurada com settings de teste, compartilhada pela classe
+
+    Returns:
+        EvolutionAPI: Cliente configurado sem depender de variáveis de ambiente
+    """
+    settings = SimpleNamespace(
+        EVO_SUBDOMAIN=TEST_SUBDOMAIN,
+        EVO_INSTANCE=TEST_INSTANCE,
+        EVO_TOKEN=TEST_TOKEN
+    )
+    with EvolutionAPI(settings=settings) as evo_api:
+        yield evo_api
+
+class TestEvolutionAPI:
+    test_number = "5524999887888"
+
+    @responses.activate
+    def test_send_text_message(self, api):
         """Testa o envio de mensagem de texto"""
-        print("\nTestando envio de mensagem de texto...")
-        
+        url = f"https://{TEST_SUBDOMAIN}/message/sendText/{TEST_INSTANCE}"
+        responses.post(url, json={"key": {"id": "mock"}}, status=201)
+
         # Mensagem de teste
         test_message = "Olá! Este é um teste automatizado da Evolution API."
-        
+
         # Enviar mensagem
-        result = self.api.send_text_message(
+        result = api.send_text_message(
             number=self.test_number,
             text=test_message
         )
-        
+
         # Verificar resultado
-        self.assertIsNotNone(result)
-        self.assertIsInstance(result, dict)
-        
-        # Verificar status
-        if result.get("status") == "error":
-            print(f"ERRO: {result.get('message')}")
-        else:
-            print("✓ Mensagem enviada com sucesso!")
-            
-        # Verificar se a API está configurada
-        self.assertTrue(self.api.is_configured)
-        
-        # Verificar se os headers estão configurados
-        self.assertIn("apikey", self.api.headers)
-        self.assertIn("Content-Type", self.api.headers)
-        
-    def test_send_template_message(self):
+        assert result == {"key": {"id": "mock"}}
+
+        # Verificar a requisição enviada
+        assert len(responses.calls) == 1
+        request = responses.calls[0].request
+        body = json.loads(request.body)
+        assert body["number"] == self.test_number
+        assert body["text"] == test_message
+        assert body["delay"] == api.estimate_typing_time(test_message, typing_speed=207)
+        assert request.headers["apikey"] == TEST_TOKEN
+        assert request.headers["Content-Type"] == "application/json"
+
+    @responses.activate
+    def test_send_text_message_error_status(self, api):
+        """Testa o tratamento de status de erro no envio de texto"""
+        url = f"https://{TEST_SUBDOMAIN}/message/sendText/{TEST_INSTANCE}"
+        responses.post(url, json={"message": "número inválido"}, status=400)
+
+        result = api.send_text_message(number=self.test_number, text="Olá")
+
+        assert result["status"] == "error"
+        assert result["status_code"] == 400
+
+    @responses.activate
+    def test_send_template_message(self, api):
         """Testa o envio de mensagem de template"""
-        print("\nTestando envio de mensagem de template...")
-        
-        # Verificar se a API está configurada antes do teste
-        if not self.api.is_configured:
-            print("AVISO: API não está configurada corretamente")
-            return
-            
-        # Verificar se temos as configurações necessárias
-        print(f"Configurações da API:")
-        print(f"- Subdomain: {self.api.evo_subdomain}")
-        print(f"- Instance: {self.api.evo_instance}")
-        print(f"- Token: {'Presente' if self.api.evo_token else 'Ausente'}")
-        
-        # Template de teste (usando um template mais comum)
+        url = f"https://{TEST_SUBDOMAIN}/message/sendTemplate/{TEST_INSTANCE}"
+        responses.post(url, json={"key": {"id": "mock"}}, status=200)
+
+        # Template de teste
         template_data = {
             "number": self.test_number,
             "template": "welcome_message",
@@ -72,62 +100,65 @@ class TestEvolutionAPI(unittest.TestCase):
                 }
             ]
         }
-        
-        print(f"Dados do template: {template_data}")
-        
+
         # Enviar template
-        result = self.api.send_template_message(**template_data)
-        
+        result = api.send_template_message(**template_data)
+
         # Verificar resultado
-        if result is None:
-            print("AVISO: Resultado é None - isso é esperado se o template não estiver configurado")
-            return
-            
-        self.assertIsInstance(result, dict)
-        
-        # Verificar status
-        if result.get("status") == "error":
-            print(f"ERRO: {result.get('message')}")
-            # Se for erro de template não encontrado, não falhar o teste
-            if "template" in str(result.get("message")).lower():
-                print("AVISO: Template não encontrado - isso é esperado se o template não estiver configurado")
-                return
-        else:
-            print("✓ Template enviado com sucesso!")
-            
-        # Verificar se os headers estão configurados
-        self.assertIn("apikey", self.api.headers)
-        self.assertIn("Content-Type", self.api.headers)
-        
-    def test_send_media_message(self):
+        assert result == {"key": {"id": "mock"}}
+
+        # O payload é repassado sem alterações
+        assert len(responses.calls) == 1
+        assert json.loads(responses.calls[0].request.body) == template_data
+
+    @responses.activate
+    def test_send_media_message(self, api):
         """Testa o envio de mensagem com mídia"""
-        print("\nTestando envio de mensagem com mídia...")
-        
+        url = f"https://{TEST_SUBDOMAIN}/message/sendMedia/{TEST_INSTANCE}"
+        responses.post(url, json={"key": {"id": "mock"}}, status=200)
+
         # URL de uma imagem de teste
         test_image_url = "https://picsum.photos/200/300"
-        
+
         # Enviar mídia
-        result = self.api.send_media_message(
+        result = api.send_media_message(
             number=self.test_number,
             mediatype="image",
             media=test_image_url,
             caption="Esta é uma imagem de teste"
         )
-        
+
         # Verificar resultado
-        self.assertIsNotNone(result)
-        self.assertIsInstance(result, dict)
-        
-        # Verificar status
-        if result.get("status") == "error":
-            print(f"ERRO: {result.get('message')}")
-        else:
-            print("✓ Mídia enviada com sucesso!")
+        assert result == {"key": {"id": "mock"}}
+
+        # Verificar a requisição enviada
+        assert len(responses.calls) == 1
+        assert json.loads(responses.calls[0].request.body) == {
+            "number": self.test_number,
+            "mediatype": "image",
+            "media": test_image_url,
+            "caption": "Esta é uma imagem de teste"
+        }
+
+    @responses.activate
+    def test_send_media_message_error_is_not_retried(self, api):
+        """Testa se um 500 do sendMedia não gera novo envio (a mídia pode já ter sido entregue)"""
+        url = f"https://{TEST_SUBDOMAIN}/message/sendMedia/{TEST_INSTANCE}"
+        responses.post(url, json={"message": "erro interno"}, status=500)
+
+        result = api.send_media_message(
+            number=self.test_number,
+            mediatype="image",
+            media="https://picsum.photos/200/300"
+        )
+
+        assert result is None
+        assert len(responses.calls) == 1
 
 def run_tests():
     """Executa os testes"""
-    print("Iniciando testes da Evolution API...")
-    unittest.main(verbosity=2)
+    logger.info("Iniciando testes da Evolution API...")
+    pytest.main([__file__, "-v"])
 
 if __name__ == '__main__':
-    run_tests() 
\ No newline at end of file
+    run_tests()
@@ -3,7 +3,8 @@ from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch, MagicMock
 import os
 import json
-from main import app, RateLimiter, call_sales_builder_api
+import main
+from main import app, submit_form_rate_limiter, call_sales_builder_api
 
 """
 Testes automatizados para a API Arduus DB
@@ -12,37 +13,65 @@ Este módulo contém testes para verificar o funcionamento correto da API,
 incluindo validação de dados, autenticação e tratamento de erros.
 """
 
+# Rota e headers das submissões de formulário
+_SUBMIT_URL = "/submit-form/"
+_JSON_HEADERS = {"content-type": "application/json"}
+
+# Corpo de formulário válido, usado como base pelos testes
+_VALID_FORM = {
+    "full_name": "Teste da Silva",
+    "corporate_email": "teste@example.com",
+    "whatsapp": "+5511987654321",
+    "company": "Empresa Teste",
+    "revenue": "1-5 milhões",
+    "job_title": "Diretor",
+    "api_key": "test_api_key"
+}
+
+# Corpos JSON serializados uma única vez, na importação do módulo
+_VALID_FORM_JSON = json.dumps(_VALID_FORM).encode()
+_INVALID_API_KEY_FORM_JSON = json.dumps({**_VALID_FORM, "api_key": "invalid_api_key"}).encode()
+_INVALID_EMAIL_FORM_JSON = json.dumps({**_VALID_FORM, "corporate_email": "email_invalido"}).encode()
+_CUSTOM_REVENUE_FORM_JSON = json.dumps({**_VALID_FORM, "revenue": "Valor Personalizado"}).encode()
+_FORMATTED_WHATSAPP_FORM_JSON = json.dumps({**_VALID_FORM, "whatsapp": "+55 11 98765-4321"}).encode()
+# Lead novo com o mesmo número de WhatsApp de um lead existente
+_DUPLICATE_FORM_JSON = json.dumps({
+    "full_name": "Novo Lead",
+    "corporate_email": "novo@example.com",
+    "whatsapp": "+5511987654321",
+    "company": "Nova Empresa",
+    "revenue": "5-10 milhões",
+    "job_title": "CTO",
+    "api_key": "test_api_key"
+}).encode()
+
 # Mock para o RateLimiter para evitar a dependência do MongoDB
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="session", autouse=True)
 def mock_rate_limiter():
     """
     Mock para o RateLimiter
     
-    Este fixture substitui temporariamente o método __call__ do RateLimiter
-    para evitar a dependência do MongoDB durante os testes.
+    Este fixture sobrescreve a dependência de rate limiting do endpoint de
+    submissão via app.dependency_overrides, uma única vez por sessão, para
+    evitar a dependência do MongoDB durante os testes.
     """
-    original_call = RateLimiter.__call__
-    
-    async def mock_call(self, request):
-        # Não faz nada, apenas retorna
-        return None
-    
-    # Substituir o método __call__ pelo mock
-    RateLimiter.__call__ = mock_call
-    
-    yield
-    
-    # Restaurar o método original
-    RateLimiter.__call__ = original_call
+    app.dependency_overrides[submit_form_rate_limiter] = lambda: None
+    try:
+        yield
+    finally:
+        # Remover a sobrescrita
+        app.dependency_overrides.pop(submit_form_rate_limiter, None)
 
 # Mock para configurações
-@pytest.fixture
+@pytest.fixture(scope="session", autouse=True)
 def mock_settings():
     """
     Mock para as configurações da aplicação
     
     Este fixture configura variáveis de ambiente temporárias para os testes,
-    incluindo a API key e a URI do MongoDB.
+    incluindo a API key e a URI do MongoDB. Os valores são os mesmos para toda
+    a suíte, então o ambiente é alterado uma única vez por sessão; um teste que
+    precise de outro valor deve usar monkeypatch.setenv localmente.
     """
     # Salvar variáveis de ambiente originais
     original_env = os.environ.copy()
@@ -57,6 +86,9 @@ def mock_settings():
     os.environ.clear()
     os.environ.update(original_env)
 
+# Mock da coleção do MongoDB, construído uma única vez e reiniciado a cada teste
+_MONGO_COLLECTION = AsyncMock()
+
 # Mock para o MongoDB
 @pytest.fixture
 def mock_mongodb():
@@ -69,9 +101,10 @@ def mock_mongodb():
     Returns:
         AsyncMock: Mock da coleção do MongoDB
     """
-    with patch("main.AsyncIOMotorClient") as mock_client:
-        # Configurar o mock para o MongoDB
-        mock_collection = AsyncMock()
+    with patch.object(main, "AsyncIOMotorClient") as mock_client:
+        # Reiniciar o mock compartilhado (chamadas, retornos e side effects do teste anterior)
+        mock_collection = _MONGO_COLLECTION
+        mock_collection.reset_mock(return_value=True, side_effect=True)
         mock_collection.insert_one.return_value = MagicMock(inserted_id="mock_id")
         
         # Por padrão, find_one retorna None (nenhum lead existente)
@@ -96,20 +129,22 @@ def mock_sales_builder_api():
     Returns:
         AsyncMock: Mock da função call_sales_builder_api
     """
-    with patch("main.call_sales_builder_api") as mock_api:
+    with patch.object(main, "call_sales_builder_api", new_callable=AsyncMock) as mock_api:
         # Configurar o mock para retornar um valor padrão
         mock_api.return_value = {"task_id": "mock_task_id"}
         
         yield mock_api
 
 # Cliente de teste
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client():
     """
     Cliente de teste para a API
     
     Este fixture cria um cliente de teste para fazer requisições
-    à API durante os testes.
+    à API durante os testes. O lifespan da aplicação (startup/shutdown)
+    roda uma única vez por sessão; os mocks por teste (mock_mongodb,
+    mock_sales_builder_api) são aplicados depois e continuam valendo.
     
     Returns:
         TestClient: Cliente de teste para a API
@@ -129,28 +164,30 @@ def test_health_check(client):
     assert response.status_code == 200
     assert response.json() == {"status": "online"}
 
-# Teste do endpoint de submissão de formulário com API key válida
-def test_submit_form_valid(client, mock_mongodb, mock_settings, mock_sales_builder_api):
+# Teste do endpoint de submissão de formulário com dados válidos
+@pytest.mark.parametrize(
+    "form_json, revenue_expected, whatsapp_expected",
+    [
+        (_VALID_FORM_JSON, "1-5 milhões", "5511987654321"),
+        # Qualquer valor de faturamento é aceito
+        (_CUSTOM_REVENUE_FORM_JSON, "Valor Personalizado", "5511987654321"),
+        # Número formatado (espaços, hífens) é limpo, sem o +
+        (_FORMATTED_WHATSAPP_FORM_JSON, "1-5 milhões", "5511987654321"),
+    ],
+    ids=["valid", "any_revenue", "formatted_whatsapp"]
+)
+def test_submit_form_valid(client, mock_mongodb, mock_settings, mock_sales_builder_api,
+                           form_json, revenue_expected, whatsapp_expected):
     """
     Testa a submissão de formulário com dados válidos
     
-    Verifica se o endpoint /submit-form/ aceita dados válidos,
+    Verifica se o endpoint /submit-form/ aceita dados válidos (incluindo
+    qualquer valor de faturamento e número de WhatsApp formatado),
     retorna status 201 e a mensagem correta, e se os dados são
     corretamente enviados para o MongoDB e à API Sales Builder.
     """
-    # Dados de teste
-    test_data = {
-        "full_name": "Teste da Silva",
-        "corporate_email": "teste@example.com",
-        "whatsapp": "+5511987654321",
-        "company": "Empresa Teste",
-        "revenue": "1-5 milhões",
-        "job_title": "Diretor",
-        "api_key": "test_api_key"
-    }
-    
     # Enviar requisição
-    response = client.post("/submit-form/", json=test_data)
+    response = client.post(_SUBMIT_URL, content=form_json, headers=_JSON_HEADERS)
     
     # Verificar resposta
     assert response.status_code == 201
@@ -166,9 +203,9 @@ def test_submit_form_valid(client, mock_mongodb, mock_settings, mock_sales_build
     called_args = mock_mongodb.insert_one.call_args[0][0]
     assert called_args["nome_prospect"] == "Teste da Silva"
     assert called_args["email_prospect"] == "teste@example.com"
-    assert called_args["whatsapp_prospect"] == "5511987654321"
+    assert called_args["whatsapp_prospect"] == whatsapp_expected
     assert called_args["empresa_prospect"] == "Empresa Teste"
-    assert called_args["faturamento_empresa"] == "1-5 milhões"
+    assert called_args["faturamento_empresa"] == revenue_expected
     assert called_args["cargo_prospect"] == "Diretor"
     assert called_args["pipe_stage"] == "fit_to_rapport"
     assert called_args["spiced_stage"] == "P1"
@@ -178,9 +215,9 @@ def test_submit_form_valid(client, mock_mongodb, mock_settings, mock_sales_build
     api_call_args = mock_sales_builder_api.call_args[0][0]
     assert api_call_args["nome_prospect"] == "Teste da Silva"
     assert api_call_args["email_prospect"] == "teste@example.com"
-    assert api_call_args["whatsapp_prospect"] == "5511987654321"
+    assert api_call_args["whatsapp_prospect"] == whatsapp_expected
     assert api_call_args["empresa_prospect"] == "Empresa Teste"
-    assert api_call_args["faturamento_prospect"] == "1-5 milhões"
+    assert api_call_args["faturamento_prospect"] == revenue_expected
     assert api_call_args["cargo_prospect"] == "Diretor"
 
 # Teste com API key inválida
@@ -191,19 +228,8 @@ def test_submit_form_invalid_api_key(client, mock_mongodb, mock_settings):
     Verifica se o endpoint /submit-form/ rejeita requisições
     com API key inválida, retornando status 401.
     """
-    # Dados de teste com API key inválida
-    test_data = {
-        "full_name": "Teste da Silva",
-        "corporate_email": "teste@example.com",
-        "whatsapp": "+5511987654321",
-        "company": "Empresa Teste",
-        "revenue": "1-5 milhões",
-        "job_title": "Diretor",
-        "api_key": "invalid_api_key"
-    }
-    
     # Enviar requisição
-    response = client.post("/submit-form/", json=test_data)
+    response = client.post(_SUBMIT_URL, content=_INVALID_API_KEY_FORM_JSON, headers=_JSON_HEADERS)
     
     # Verificar resposta
     assert response.status_code == 401
@@ -220,19 +246,8 @@ def test_submit_form_invalid_data(client, mock_mongodb, mock_settings):
     Verifica se o endpoint /submit-form/ rejeita requisições
     com dados inválidos, retornando status 422.
     """
-    # Dados de teste inválidos (email incorreto)
-    test_data = {
-        "full_name": "Teste da Silva",
-        "corporate_email": "email_invalido",  # Email inválido
-        "whatsapp": "+5511987654321",
-        "company": "Empresa Teste",
-        "revenue": "1-5 milhões",
-        "job_title": "Diretor",
-        "api_key": "test_api_key"
-    }
-    
     # Enviar requisição
-    response = client.post("/submit-form/", json=test_data)
+    response = client.post(_SUBMIT_URL, content=_INVALID_EMAIL_FORM_JSON, headers=_JSON_HEADERS)
     
     # Verificar resposta
     assert response.status_code == 422  # Erro de validação
@@ -240,98 +255,6 @@ def test_submit_form_invalid_data(client, mock_mongodb, mock_settings):
     # Verificar que o MongoDB não foi chamado
     mock_mongodb.insert_one.assert_not_called()
 
-# Teste com faturamento inválido
-def test_submit_form_any_revenue(client, mock_mongodb, mock_settings, mock_sales_builder_api):
-    """
-    Testa a submissão de formulário com qualquer valor de faturamento
-    
-    Verifica se o endpoint /submit-form/ aceita requisições
-    com qualquer valor de faturamento, retornando status 201.
-    """
-    # Dados de teste com faturamento personalizado
-    test_data = {
-        "full_name": "Teste da Silva",
-        "corporate_email": "teste@example.com",
-        "whatsapp": "+5511987654321",
-        "company": "Empresa Teste",
-        "revenue": "Valor Personalizado",  # Faturamento personalizado
-        "job_title": "Diretor",
-        "api_key": "test_api_key"
-    }
-    
-    # Enviar requisição
-    response = client.post("/submit-form/", json=test_data)
-    
-    # Verificar resposta
-    assert response.status_code == 201
-    assert "document_id" in response.json()
-    assert "sales_builder_task_id" in response.json()
-    assert response.json()["message"] == "Formulário recebido com sucesso"
-    assert response.json()["sales_builder_task_id"] == "mock_task_id"
-    
-    # Verificar se o MongoDB foi chamado corretamente
-    mock_mongodb.insert_one.assert_called_once()
-    
-    # Verificar documento enviado
-    called_args = mock_mongodb.insert_one.call_args[0][0]
-    assert called_args["faturamento_empresa"] == "Valor Personalizado"
-    assert called_args["pipe_stage"] == "fit_to_rapport"
-    assert called_args["spiced_stage"] == "P1"
-    
-    # Verificar se a API Sales Builder foi chamada corretamente
-    mock_sales_builder_api.assert_called_once()
-    api_call_args = mock_sales_builder_api.call_args[0][0]
-    assert api_call_args["faturamento_prospect"] == "Valor Personalizado"
-
-# Teste com número de WhatsApp formatado
-def test_submit_form_formatted_whatsapp(client, mock_mongodb, mock_settings, mock_sales_builder_api):
-    """
-    Testa a submissão de formulário com número de WhatsApp formatado
-    
-    Verifica se o endpoint /submit-form/ aceita requisições
-    com número de WhatsApp contendo formatação (espaços, hífens),
-    limpa o número corretamente e retorna status 201.
-    """
-    # Dados de teste com número de WhatsApp formatado
-    test_data = {
-        "full_name": "Teste da Silva",
-        "corporate_email": "teste@example.com",
-        "whatsapp": "+55 11 98765-4321",  # Número formatado
-        "company": "Empresa Teste",
-        "revenue": "1-5 milhões",
-        "job_title": "Diretor",
-        "api_key": "test_api_key"
-    }
-    
-    # Enviar requisição
-    response = client.post("/submit-form/", json=test_data)
-    
-    # Verificar resposta
-    assert response.status_code == 201
-    assert "document_id" in response.json()
-    assert "sales_builder_task_id" in response.json()
-    assert response.json()["message"] == "Formulário recebido com sucesso"
-    assert response.json()["sales_builder_task_id"] == "mock_task_id"
-    
-    # Verificar se o MongoDB foi chamado corretamente
-    mock_mongodb.insert_one.assert_called_once()
-    
-    # Verificar documento enviado
-    called_args = mock_mongodb.insert_one.call_args[0][0]
-    assert called_args["nome_prospect"] == "Teste da Silva"
-    assert called_args["email_prospect"] == "teste@example.com"
-    assert called_args["whatsapp_prospect"] == "5511987654321"  # Número limpo sem o +
-    assert called_args["empresa_prospect"] == "Empresa Teste"
-    assert called_args["faturamento_empresa"] == "1-5 milhões"
-    assert called_args["cargo_prospect"] == "Diretor"
-    assert called_args["pipe_stage"] == "fit_to_rapport"
-    assert called_args["spiced_stage"] == "P1"
-    
-    # Verificar se a API Sales Builder foi chamada corretamente
-    mock_sales_builder_api.assert_called_once()
-    api_call_args = mock_sales_builder_api.call_args[0][0]
-    assert api_call_args["whatsapp_prospect"] == "5511987654321" 
-
 # Teste com falha na chamada à API Sales Builder
 def test_submit_form_sales_builder_api_failure(client, mock_mongodb, mock_settings, mock_sales_builder_api):
     """
@@ -343,19 +266,8 @@ def test_submit_form_sales_builder_api_failure(client, mock_mongodb, mock_settin
     # Configurar o mock para lançar uma exceção
     mock_sales_builder_api.side_effect = Exception("API Sales Builder indisponível")
     
-    # Dados de teste
-    test_data = {
-        "full_name": "Teste da Silva",
-        "corporate_email": "teste@example.com",
-        "whatsapp": "+5511987654321",
-        "company": "Empresa Teste",
-        "revenue": "1-5 milhões",
-        "job_title": "Diretor",
-        "api_key": "test_api_key"
-    }
-    
     # Enviar requisição
-    response = client.post("/submit-form/", json=test_data)
+    response = client.post(_SUBMIT_URL, content=_VALID_FORM_JSON, headers=_JSON_HEADERS)
     
     # Verificar resposta
     assert response.status_code == 201
@@ -395,19 +307,8 @@ def test_submit_form_duplicate_whatsapp(client, mock_mongodb, mock_settings, moc
     # Configurar o mock para retornar o lead existente quando find_one for chamado
     mock_mongodb.find_one.return_value = existing_lead
     
-    # Dados de teste com o mesmo número de WhatsApp
-    test_data = {
-        "full_name": "Novo Lead",
-        "corporate_email": "novo@example.com",
-        "whatsapp": "+5511987654321",  # Mesmo número do lead existente
-        "company": "Nova Empresa",
-        "revenue": "5-10 milhões",
-        "job_title": "CTO",
-        "api_key": "test_api_key"
-    }
-    
     # Enviar requisição
-    response = client.post("/submit-form/", json=test_data)
+    response = client.post(_SUBMIT_URL, content=_DUPLICATE_FORM_JSON, headers=_JSON_HEADERS)
     
     # Verificar resposta
     assert response.status_code == 201  # Created
@@ -424,4 +325,86 @@ def test_submit_form_duplicate_whatsapp(client, mock_mongodb, mock_settings, moc
     mock_mongodb.insert_one.assert_not_called()
     
     # Verificar que a API Sales Builder não foi chamada
-    mock_sales_builder_api.assert_not_called() 
\ No newline at end of file
+    mock_sales_builder_api.assert_not_called()
+
+
+# Fila de requisições com a task do webhook, registrada para o número do formulário válido
+@pytest.fixture
+def webhook_request_queue(monkeypatch):
+    """
+    Configura o segredo do webhook e uma fila de requisições com a task "task-123"
+    """
+    monkeypatch.setenv("SALES_BUILDER_WEBHOOK_SECRET", "test_webhook_secret")
+    request_queue = MagicMock()
+    request_queue.find_one = AsyncMock(return_value={"whatsapp_prospect": "5511987654321"})
+    monkeypatch.setattr(app, "request_queue", request_queue, raising=False)
+    return request_queue
+
+# Teste do webhook do Sales Builder
+@pytest.mark.parametrize("delivered", [True, False], ids=["delivered", "stored_until_waiting"])
+def test_sales_builder_webhook(client, webhook_request_queue, delivered):
+    """
+    Testa o webhook de resultado do Sales Builder
+    
+    Verifica se o corpo recebido é repassado à verificação da task, inclusive
+    quando ela ainda não começou (o corpo é guardado até lá).
+    """
+    task_data = {"task_id": "task-123", "result": {"whatsapp_prospect": "+55 11 98765-4321", "msg_resposta": ["Olá"]}}
+    
+    with patch("sales_builder_status_checker.deliver_task_result", return_value=delivered) as mock_deliver:
+        response = client.post(
+            "/webhooks/sales-builder", headers={"X-Webhook-Secret": "test_webhook_secret"}, json=task_data
+        )
+    
+    assert response.status_code == 202
+    webhook_request_queue.find_one.assert_awaited_once_with({"task_id": "task-123"}, {"whatsapp_prospect": 1})
+    mock_deliver.assert_called_once_with(task_data)
+
+# Teste do webhook com segredo inválido, ausente ou igual à API key dos formulários
+@pytest.mark.parametrize("headers", [
+    {"X-Webhook-Secret": "invalid_secret"},
+    {},
+    {"X-Webhook-Secret": "test_api_key"},
+], ids=["invalid", "missing", "form_api_key"])
+def test_sales_builder_webhook_invalid_secret(client, webhook_request_queue, headers):
+    """
+    Testa se o webhook rejeita requisições sem o segredo correto, sem entregar o corpo
+    """
+    with patch("sales_builder_status_checker.deliver_task_result") as mock_deliver:
+        response = client.post(
+            "/webhooks/sales-builder", headers=headers,
+            json={"task_id": "task-123", "result": {"whatsapp_prospect": "5511987654321"}}
+        )
+    
+    assert response.status_code == 401
+    mock_deliver.assert_not_called()
+
+# Teste do webhook com número diferente do registrado para a task
+def test_sales_builder_webhook_whatsapp_mismatch(client, webhook_request_queue):
+    """
+    Testa se o webhook rejeita um resultado destinado a outro número de WhatsApp
+    """
+    with patch("sales_builder_status_checker.deliver_task_result") as mock_deliver:
+        response = client.post(
+            "/webhooks/sales-builder", headers={"X-Webhook-Secret": "test_webhook_secret"},
+            json={"task_id": "task-123", "result": {"whatsapp_prospect": "5511900000000", "msg_resposta": ["Olá"]}}
+        )
+    
+    assert response.status_code == 403
+    mock_deliver.assert_not_called()
+
+# Teste do webhook para uma task desconhecida
+def test_sales_builder_webhook_unknown_task(client, webhook_request_queue):
+    """
+    Testa se o webhook rejeita tasks que não foram criadas por esta aplicação
+    """
+    webhook_request_queue.find_one.return_value = None
+    
+    with patch("sales_builder_status_checker.deliver_task_result") as mock_deliver:
+        response = client.post(
+            "/webhooks/sales-builder", headers={"X-Webhook-Secret": "test_webhook_secret"},
+            json={"task_id": "task-999", "result": {"whatsapp_prospect": "5511987654321"}}
+        )
+    
+    assert response.status_code == 404
+    mock_deliver.assert_not_called()
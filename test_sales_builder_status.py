@@ -1,241 +1,382 @@
 import pytest
+import pytest_asyncio
 import asyncio
+import orjson
 import os
-from unittest.mock import AsyncMock, MagicMock, patch
-from sales_builder_status_checker import SalesBuilderStatusChecker, process_sales_builder_task
-
-# Exemplo de resposta da API Sales Builder
-SAMPLE_RESPONSE = {
-    "task_id": "1741882913572_8470f029",
-    "queue": "sales-builder",
-    "state": "COMPLETED",
-    "result": {
-        "analise_icp": None,
-        "atendimento": {
-            "interacao": "Iniciar a conversa com lead à partir do P1",
-            "status": "primeiro_contato",
-            "p_atual": "P1",
-            "tipo_interacao": "positivo",
-            "p_proxima": "P2",
-            "msg_resposta": [
-                "Oi Guilherme, tudo bem? Aqui é o Vagner Campos da Arduus! Vi suas discussões interessantes sobre liderança em tecnologia no LinkedIn",
-                "Percebi que temos visões alinhadas sobre como a inovação pode transformar ciclos de trabalho. Gostaria de saber mais sobre seus objetivos com IA?"
-            ],
-            "periodo_agendamento": "NULL",
-            "horario_agendamento": "NULL",
-            "dia_agendamento": "NULL",
-            "link_agendamento_google_calendar": "NULL",
-            "link_meet_google": "NULL"
-        },
-        "msg_resposta": [
-            "Oi Guilherme, tudo bem? Aqui é o Vagner Campos da Arduus! Vi suas discussões interessantes sobre liderança em tecnologia no LinkedIn",
-            "Percebi que temos visões alinhadas sobre como a inovação pode transformar ciclos de trabalho. Gostaria de saber mais sobre seus objetivos com IA?"
-        ],
-        "nome_prospect": "Guilherme Moura",
-        "whatsapp_prospect": "5524999887888"
-    },
-    "timestamp": "2025-03-13T16:30:17.336866+00:00"
-}
+from types import SimpleNamespace
+from unittest.mock import ANY, AsyncMock, MagicMock, call, patch
+import sales_builder_status_checker
+from sales_builder_status_checker import (
+    SalesBuilderStatusChecker, close_checker, deliver_task_result, get_checker, process_sales_builder_task
+)
+
+@pytest.fixture(autouse=True)
+def webhook_registry(monkeypatch):
+    """Registros de webhook do módulo vazios em cada teste"""
+    monkeypatch.setattr(sales_builder_status_checker, "_pending_tasks", {})
+    monkeypatch.setattr(sales_builder_status_checker, "_early_results", {})
+
+@pytest_asyncio.fixture
+async def checker():
+    """
+    Verificador apontando para uma API de teste, fechado ao final de cada teste
+    """
+    checker = SalesBuilderStatusChecker(api_url="https://test-api.com")
+    yield checker
+    await checker.close()
 
 # Teste da classe SalesBuilderStatusChecker
 @pytest.mark.asyncio
-async def test_check_task_status():
-    # Mock para o cliente httpx
-    with patch("sales_builder_status_checker.httpx.AsyncClient") as mock_client_class:
-        # Configurar o mock do cliente
-        mock_client = AsyncMock()
-        mock_client_class.return_value = mock_client
-        
-        # Configurar o mock da resposta com mensagens
-        mock_response_with_messages = MagicMock()
-        mock_response_with_messages.status_code = 200
-        mock_response_with_messages.json.return_value = SAMPLE_RESPONSE
-        
-        # Configurar o mock da resposta sem mensagens
-        response_without_messages = {
-            "task_id": "1741882913572_8470f029",
-            "queue": "sales-builder",
-            "state": "COMPLETED",
-            "result": {
-                "analise_icp": None,
-                "atendimento": {
-                    "interacao": "Iniciar a conversa com lead à partir do P1",
-                    "status": "primeiro_contato",
-                    "p_atual": "P1",
-                    "tipo_interacao": "positivo",
-                    "p_proxima": "P2",
-                    "msg_resposta": [],  # Lista vazia
-                    "periodo_agendamento": "NULL",
-                    "horario_agendamento": "NULL",
-                    "dia_agendamento": "NULL",
-                    "link_agendamento_google_calendar": "NULL",
-                    "link_meet_google": "NULL"
-                },
+@patch("asyncio.sleep", new_callable=AsyncMock)
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status(mock_get_client, mock_sleep, checker, sample_response):
+    # Configurar o mock do cliente httpx
+    mock_client = AsyncMock()
+    mock_get_client.return_value = mock_client
+    
+    # Configurar o mock da resposta com mensagens
+    mock_response_with_messages = MagicMock()
+    mock_response_with_messages.status_code = 200
+    mock_response_with_messages.content = orjson.dumps(sample_response)
+    
+    # Configurar o mock da resposta sem mensagens
+    response_without_messages = {
+        "task_id": "1741882913572_8470f029",
+        "queue": "sales-builder",
+        "state": "COMPLETED",
+        "result": {
+            "analise_icp": None,
+            "atendimento": {
+                "interacao": "Iniciar a conversa com lead à partir do P1",
+                "status": "primeiro_contato",
+                "p_atual": "P1",
+                "tipo_interacao": "positivo",
+                "p_proxima": "P2",
                 "msg_resposta": [],  # Lista vazia
-                "nome_prospect": "Guilherme Moura",
-                "whatsapp_prospect": "5524999887888"
+                "periodo_agendamento": "NULL",
+                "horario_agendamento": "NULL",
+                "dia_agendamento": "NULL",
+                "link_agendamento_google_calendar": "NULL",
+                "link_meet_google": "NULL"
             },
-            "timestamp": "2025-03-13T16:30:17.336866+00:00"
-        }
-        mock_response_without_messages = MagicMock()
-        mock_response_without_messages.status_code = 200
-        mock_response_without_messages.json.return_value = response_without_messages
-        
-        # Configurar o mock para retornar primeiro a resposta sem mensagens e depois com mensagens
-        mock_client.get.side_effect = [mock_response_without_messages, mock_response_with_messages]
-        
-        # Mock para asyncio.sleep para não esperar realmente
-        with patch("asyncio.sleep", new=AsyncMock()) as mock_sleep:
-            # Inicializar o checker com retry_delay reduzido para o teste
-            checker = SalesBuilderStatusChecker(api_url="https://test-api.com", retry_delay=1)
-            
-            # Testar a verificação de status
-            result = await checker.check_task_status("test_task_id")
-            
-            # Verificar se o método get foi chamado duas vezes
-            assert mock_client.get.call_count == 2
-            
-            # Verificar se sleep foi chamado com 30 segundos
-            mock_sleep.assert_called_once_with(30)
-            
-            # Verificar se o resultado é o esperado (a resposta com mensagens)
-            assert result == SAMPLE_RESPONSE
-            
-            # Fechar o cliente
-            await checker.close()
+            "msg_resposta": [],  # Lista vazia
+            "nome_prospect": "Guilherme Moura",
+            "whatsapp_prospect": "5524999887888"
+        },
+        "timestamp": "2025-03-13T16:30:17.336866+00:00"
+    }
+    mock_response_without_messages = MagicMock()
+    mock_response_without_messages.status_code = 200
+    mock_response_without_messages.content = orjson.dumps(response_without_messages)
+    mock_response_without_messages.headers = {"ETag": '"abc"'}
+    
+    # Configurar o mock para retornar primeiro a resposta sem mensagens e depois com mensagens
+    mock_client.get.side_effect = [mock_response_without_messages, mock_response_with_messages]
+    
+    # Backoff reduzido para o teste
+    checker.retry_base = 1
+    
+    # Testar a verificação de status
+    result = await checker.check_task_status("test_task_id")
+    
+    # Verificar se o método get foi chamado duas vezes
+    assert mock_client.get.call_count == 2
+    
+    # A segunda consulta é condicional, com o ETag da primeira resposta
+    first_headers = mock_client.get.call_args_list[0].kwargs["headers"]
+    second_headers = mock_client.get.call_args_list[1].kwargs["headers"]
+    assert "If-None-Match" not in first_headers
+    assert second_headers == {**checker.headers, "If-None-Match": '"abc"'}
+    
+    # Verificar se houve uma única espera, com backoff limitado a retry_cap
+    mock_sleep.assert_awaited_once()
+    assert 0 < mock_sleep.await_args.args[0] <= checker.retry_cap
+    
+    # Verificar se o resultado é o esperado (a resposta com mensagens e o status HTTP)
+    assert result == {**sample_response, "status_code": 200}
 
 @pytest.mark.asyncio
-async def test_check_task_status_with_messages_immediately():
-    # Mock para o cliente httpx
-    with patch("sales_builder_status_checker.httpx.AsyncClient") as mock_client_class:
-        # Configurar o mock do cliente
-        mock_client = AsyncMock()
-        mock_client_class.return_value = mock_client
-        
-        # Configurar o mock da resposta com mensagens imediatamente
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = SAMPLE_RESPONSE
-        mock_client.get.return_value = mock_response
-        
-        # Inicializar o checker
-        checker = SalesBuilderStatusChecker(api_url="https://test-api.com")
-        
-        # Testar a verificação de status
-        result = await checker.check_task_status("test_task_id")
-        
-        # Verificar se o método get foi chamado corretamente
-        mock_client.get.assert_called_once_with(
-            "https://test-api.com/status/test_task_id", 
-            timeout=checker.timeout
-        )
-        
-        # Verificar se o resultado é o esperado
-        assert result == SAMPLE_RESPONSE
-        
-        # Fechar o cliente
-        await checker.close()
+@patch("asyncio.sleep", new_callable=AsyncMock)
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status_not_modified_reuses_previous_body(mock_get_client, mock_sleep, checker, sample_response):
+    mock_client = AsyncMock()
+    mock_get_client.return_value = mock_client
+    
+    # Primeira resposta sem mensagens, com ETag
+    pending = {**sample_response, "result": {**sample_response["result"], "msg_resposta": []}}
+    mock_response_pending = MagicMock()
+    mock_response_pending.status_code = 200
+    mock_response_pending.content = orjson.dumps(pending)
+    mock_response_pending.headers = {"ETag": '"abc"'}
+    
+    # Segunda resposta 304 sem corpo: não deve ser decodificada
+    mock_response_not_modified = MagicMock()
+    mock_response_not_modified.status_code = 304
+    mock_response_not_modified.content = b""
+    
+    mock_client.get.side_effect = [mock_response_pending, mock_response_not_modified]
+    
+    checker.max_retries = 2
+    checker.retry_base = 1
+    result = await checker.check_task_status("test_task_id")
+    
+    # Com as tentativas esgotadas, o corpo anterior é devolvido para acionar o fallback
+    assert result == {**pending, "status_code": 200}
 
 @pytest.mark.asyncio
-async def test_process_task_response():
-    # Mock para a classe EvolutionAPI
-    with patch("sales_builder_status_checker.EvolutionAPI") as mock_evo_api_class:
-        # Mock para o método insert_chat_history
-        with patch.object(SalesBuilderStatusChecker, "insert_chat_history") as mock_insert_history:
-            # Configurar o mock da classe EvolutionAPI
-            mock_evo_api = MagicMock()
-            mock_evo_api.send_text_message = AsyncMock(return_value={"status": "success"})
-            mock_evo_api.is_configured = True
-            mock_evo_api_class.return_value = mock_evo_api
-            
-            # Configurar o mock do método insert_chat_history
-            mock_insert_history.return_value = {"inserted_id": "mock_id"}
-            
-            # Inicializar o checker
-            checker = SalesBuilderStatusChecker()
-            
-            # Testar o processamento da resposta
-            result = await checker.process_task_response(SAMPLE_RESPONSE)
-            
-            # Verificar se o método send_text_message foi chamado corretamente
-            assert mock_evo_api.send_text_message.call_count == 2
-            
-            # Verificar a primeira chamada
-            mock_evo_api.send_text_message.assert_any_call(
-                number="5524999887888",
-                text="Oi Guilherme, tudo bem? Aqui é o Vagner Campos da Arduus! Vi suas discussões interessantes sobre liderança em tecnologia no LinkedIn"
-            )
-            
-            # Verificar a segunda chamada
-            mock_evo_api.send_text_message.assert_any_call(
-                number="5524999887888",
-                text="Percebi que temos visões alinhadas sobre como a inovação pode transformar ciclos de trabalho. Gostaria de saber mais sobre seus objetivos com IA?"
-            )
-            
-            # Verificar se o método insert_chat_history foi chamado corretamente
-            assert mock_insert_history.call_count == 2
-            
-            # Verificar a primeira chamada ao insert_chat_history
-            mock_insert_history.assert_any_call(
-                "5524999887888",
-                "Oi Guilherme, tudo bem? Aqui é o Vagner Campos da Arduus! Vi suas discussões interessantes sobre liderança em tecnologia no LinkedIn",
-                SAMPLE_RESPONSE
-            )
-            
-            # Verificar a segunda chamada ao insert_chat_history
-            mock_insert_history.assert_any_call(
-                "5524999887888",
-                "Percebi que temos visões alinhadas sobre como a inovação pode transformar ciclos de trabalho. Gostaria de saber mais sobre seus objetivos com IA?",
-                SAMPLE_RESPONSE
-            )
-            
-            # Verificar se o resultado é o esperado
-            assert result is True
-            
-            # Fechar o cliente
-            await checker.close()
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status_budget_expired_returns_last_body(mock_get_client, checker, sample_response):
+    mock_client = AsyncMock()
+    mock_get_client.return_value = mock_client
+    
+    # A task responde 200, mas sem mensagens
+    pending = {**sample_response, "result": {**sample_response["result"], "msg_resposta": []}}
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.content = orjson.dumps(pending)
+    mock_client.get.return_value = mock_response
+    
+    # O orçamento total expira durante a espera entre tentativas
+    checker.retry_base = 10
+    checker.total_timeout = 0.05
+    result = await checker.check_task_status("test_task_id")
+    
+    # A última resposta é devolvida com status 200 para acionar o fallback
+    assert result == {**pending, "status_code": 200}
+    mock_client.get.assert_awaited_once()
 
 @pytest.mark.asyncio
-async def test_check_and_process_task():
-    # Mock para o método check_task_status
-    with patch.object(SalesBuilderStatusChecker, "check_task_status") as mock_check_status:
-        # Mock para o método process_task_response
-        with patch.object(SalesBuilderStatusChecker, "process_task_response") as mock_process_response:
-            # Configurar os mocks
-            mock_check_status.return_value = SAMPLE_RESPONSE
-            mock_process_response.return_value = True
-            
-            # Inicializar o checker
-            checker = SalesBuilderStatusChecker()
-            
-            # Testar o processamento completo
-            result = await checker.check_and_process_task("test_task_id")
-            
-            # Verificar se os métodos foram chamados corretamente
-            mock_check_status.assert_called_once_with("test_task_id")
-            mock_process_response.assert_called_once_with(SAMPLE_RESPONSE)
-            
-            # Verificar se o resultado é o esperado
-            assert result is True
-            
-            # Fechar o cliente
-            await checker.close()
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status_with_messages_immediately(mock_get_client, checker, sample_response):
+    # Configurar o mock do cliente httpx
+    mock_client = AsyncMock()
+    mock_get_client.return_value = mock_client
+    
+    # Configurar o mock da resposta com mensagens imediatamente
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.content = orjson.dumps(sample_response)
+    mock_client.get.return_value = mock_response
+    
+    # Testar a verificação de status
+    result = await checker.check_task_status("test_task_id")
+    
+    # Verificar se o método get foi chamado corretamente
+    mock_client.get.assert_called_once_with(
+        "https://test-api.com/status/test_task_id", 
+        headers=checker.headers,
+        timeout=checker.timeout
+    )
+    
+    # Verificar se o resultado é o esperado
+    assert result == {**sample_response, "status_code": 200}
 
 @pytest.mark.asyncio
-async def test_process_sales_builder_task():
-    # Mock para o método check_and_process_task
-    with patch.object(SalesBuilderStatusChecker, "check_and_process_task") as mock_check_process:
-        # Configurar o mock
-        mock_check_process.return_value = True
-        
-        # Testar a função principal
-        result = await process_sales_builder_task("test_task_id")
-        
-        # Verificar se o método foi chamado corretamente
-        mock_check_process.assert_called_once_with("test_task_id")
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status_via_webhook(mock_get_client, checker, sample_response):
+    checker.use_webhook = True
+    
+    # Iniciar a verificação e entregar o resultado como o handler do webhook faria
+    pending = asyncio.create_task(checker.check_task_status(sample_response["task_id"]))
+    await asyncio.sleep(0)
+    assert deliver_task_result(sample_response)
+    
+    # A verificação retorna o corpo entregue sem consultar o status
+    result = await asyncio.wait_for(pending, timeout=1)
+    assert result == {**sample_response, "status_code": 200}
+    mock_get_client.assert_not_awaited()
+
+@pytest.mark.asyncio
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status_webhook_delivered_before_waiting(mock_get_client, checker, sample_response):
+    checker.use_webhook = True
+    
+    # O webhook chega antes de a verificação começar: o corpo é guardado
+    assert not deliver_task_result(sample_response)
+    
+    # A verificação usa o corpo guardado, sem consultar o status
+    result = await asyncio.wait_for(checker.check_task_status(sample_response["task_id"]), timeout=1)
+    assert result == {**sample_response, "status_code": 200}
+    mock_get_client.assert_not_awaited()
+    assert sample_response["task_id"] not in sales_builder_status_checker._early_results
+
+@pytest.mark.asyncio
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status_polls_at_low_rate_while_waiting_for_webhook(mock_get_client, checker, sample_response):
+    mock_client = AsyncMock()
+    mock_get_client.return_value = mock_client
+    pending = {**sample_response, "result": {**sample_response["result"], "msg_resposta": []}}
+    mock_pending = MagicMock()
+    mock_pending.status_code = 200
+    mock_pending.content = orjson.dumps(pending)
+    mock_completed = MagicMock()
+    mock_completed.status_code = 200
+    mock_completed.content = orjson.dumps(sample_response)
+    mock_client.get.side_effect = [mock_pending, mock_completed]
+    
+    # O webhook não chega (perdido ou entregue a outra instância)
+    checker.use_webhook = True
+    checker.webhook_poll_interval = 0.01
+    
+    result = await asyncio.wait_for(checker.check_task_status(sample_response["task_id"]), timeout=1)
+    
+    # A consulta espaçada encontra a task concluída antes de webhook_timeout
+    assert result == {**sample_response, "status_code": 200}
+    assert mock_client.get.await_count == 2
+
+@pytest.mark.asyncio
+@patch("sales_builder_status_checker.get_http_client", new_callable=AsyncMock)
+async def test_check_task_status_webhook_timeout_falls_back_to_polling(mock_get_client, checker, sample_response):
+    mock_client = AsyncMock()
+    mock_get_client.return_value = mock_client
+    pending = {**sample_response, "result": {**sample_response["result"], "msg_resposta": []}}
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.content = orjson.dumps(pending)
+    mock_client.get.return_value = mock_response
+    
+    # Webhook habilitado, mas sem entrega dentro do prazo
+    checker.use_webhook = True
+    checker.webhook_timeout = 0.01
+    checker.max_retries = 1
+    
+    result = await checker.check_task_status(sample_response["task_id"])
+    
+    # Uma consulta durante a espera e outra já na consulta frequente, que aciona o fallback
+    assert result == {**pending, "status_code": 200}
+    assert mock_client.get.await_count == 2
+
+@pytest.mark.asyncio
+@patch.object(SalesBuilderStatusChecker, "insert_chat_histories_bulk")
+async def test_process_task_response(mock_insert_bulk, checker, sample_response):
+    # Mock da Evolution API (o checker do fixture já existe, então o mock é atribuído)
+    # Cada envio cede o event loop antes de terminar, para que envios concorrentes se intercalem
+    events = []
+    
+    async def send(number, text):
+        events.append(("start", text))
+        await asyncio.sleep(0)
+        events.append(("end", text))
+        return {"status": "success"}
+    
+    mock_evo_api = MagicMock()
+    mock_evo_api.send_text_message_async = AsyncMock(side_effect=send)
+    mock_evo_api.is_configured = True
+    mock_evo_api.aclose = AsyncMock()
+    checker.evo_api = mock_evo_api
+    
+    # Configurar o mock do método insert_chat_histories_bulk
+    mock_insert_bulk.return_value = {"inserted_ids": ["mock_id_1", "mock_id_2"]}
+    expected_messages = sample_response["result"]["msg_resposta"]
+    
+    # Testar o processamento da resposta
+    result = await checker.process_task_response(sample_response)
+    
+    # As mensagens são enviadas na ordem da lista
+    assert mock_evo_api.send_text_message_async.await_args_list == [
+        call(
+            number="5524999887888",
+            text="Oi Guilherme, tudo bem? Aqui é o Vagner Campos da Arduus! Vi suas discussões interessantes sobre liderança em tecnologia no LinkedIn"
+        ),
+        call(
+            number="5524999887888",
+            text="Percebi que temos visões alinhadas sobre como a inovação pode transformar ciclos de trabalho. Gostaria de saber mais sobre seus objetivos com IA?"
+        )
+    ]
+    
+    # Uma mensagem só é enviada depois que a anterior terminou
+    assert events == [(stage, text) for text in expected_messages for stage in ("start", "end")]
+    
+    # Descarregar a fila grava os históricos pendentes
+    await checker.flush_history()
+    
+    # Verificar se o histórico foi inserido em uma única operação com as duas mensagens
+    mock_insert_bulk.assert_awaited_once()
+    docs = mock_insert_bulk.await_args[0][0]
+    assert len(docs) == 2
+    assert all(doc["session_id"] == "5524999887888" for doc in docs)
+    assert [doc["msg_resposta"][0] for doc in docs] == expected_messages
+    
+    # Verificar se o resultado é o esperado
+    assert result is True
+
+@pytest.mark.asyncio
+@patch.object(SalesBuilderStatusChecker, "process_task_response", return_value=True)
+@patch.object(SalesBuilderStatusChecker, "check_task_status")
+async def test_check_and_process_task(mock_check_status, mock_process_response, checker, sample_response):
+    # Configurar o mock da verificação de status
+    mock_check_status.return_value = sample_response
+    
+    # Testar o processamento completo
+    result = await checker.check_and_process_task("test_task_id")
+    
+    # Verificar se os métodos foram chamados corretamente
+    mock_check_status.assert_called_once_with("test_task_id")
+    mock_process_response.assert_called_once_with(sample_response)
+    
+    # Verificar se o resultado é o esperado
+    assert result is True
+
+@pytest.mark.asyncio
+async def test_get_checker_reuses_instance_and_warns_on_other_settings(monkeypatch):
+    monkeypatch.setattr(sales_builder_status_checker, "_checker", None)
+    settings = SimpleNamespace(
+        EVO_SUBDOMAIN="evo.test",
+        EVO_INSTANCE="instancia-teste",
+        EVO_TOKEN="token-teste",
+        SALES_BUILDER_API_KEY="chave_teste"
+    )
+    
+    checker = get_checker(settings)
+    try:
+        # Chamadas seguintes, com as mesmas configurações ou sem elas, reutilizam o verificador
+        assert get_checker(SimpleNamespace(**vars(settings))) is checker
+        assert get_checker() is checker
         
-        # Verificar se o resultado é o esperado
-        assert result is True
+        # Configurações diferentes não substituem as do verificador, mas geram um aviso
+        with patch.object(sales_builder_status_checker.logger, "warning") as mock_warning:
+            other_settings = SimpleNamespace(**{**vars(settings), "SALES_BUILDER_API_KEY": "outra_chave"})
+            assert get_checker(other_settings) is checker
+        mock_warning.assert_called_once()
+        assert checker.api_key == "chave_teste"
+    finally:
+        await close_checker()
+
+@pytest.mark.asyncio
+@patch("sales_builder_status_checker.get_checker")
+async def test_process_sales_builder_task(mock_get_checker):
+    # Verificador compartilhado mockado, isolando o singleton do módulo
+    mock_checker = MagicMock()
+    mock_checker.check_and_process_task = AsyncMock(return_value=True)
+    mock_get_checker.return_value = mock_checker
+    
+    # Testar a função principal
+    result = await process_sales_builder_task("test_task_id")
+    
+    # Verificar se o método foi chamado corretamente (sem fila de requisições)
+    mock_get_checker.assert_called_once_with(None)
+    mock_checker.check_and_process_task.assert_awaited_once_with("test_task_id", None, None, progress=ANY)
+    
+    # O verificador compartilhado não é fechado ao final da task
+    mock_checker.close.assert_not_called()
+    
+    # Verificar se o resultado é o esperado
+    assert result is True
+
+@pytest.mark.asyncio
+@patch("sales_builder_status_checker.RequestProgress")
+@patch("sales_builder_status_checker.get_checker", side_effect=RuntimeError("falha na criação"))
+async def test_process_sales_builder_task_checker_creation_error(mock_get_checker, mock_progress_cls):
+    # Uma falha ao criar o verificador é registrada como passo, e os passos são gravados
+    progress = mock_progress_cls.return_value
+    progress.flush = AsyncMock()
+    
+    result = await process_sales_builder_task("test_task_id")
+    
+    assert result is False
+    steps = [c.args[0] for c in progress.record_step.call_args_list]
+    assert steps == ["task_processing_started", "task_processing_error"]
+    progress.flush.assert_awaited_once()
 
 if __name__ == "__main__":
-    pytest.main(["-v", "test_sales_builder_status.py"]) 
\ No newline at end of file
+    pytest.main(["-v", "test_sales_builder_status.py"])
@@ -1,37 +1,50 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+import responses
 from evo_api_v2 import EvolutionAPI
 from dotenv import load_dotenv
 import time
 
-def test_send_messages():
+# Número de teste
+TEST_NUMBER = "5524999887888"
+
+# Configurações usadas no teste com HTTP mockado
+_TEST_SETTINGS = SimpleNamespace(
+    EVO_SUBDOMAIN="evo.test",
+    EVO_INSTANCE="instancia-teste",
+    EVO_TOKEN="token-teste"
+)
+
+def send_messages(api, test_number=TEST_NUMBER):
     """
-    Teste específico para enviar mensagens para o número 5524999887888
+    Envia uma mensagem de texto, uma imagem e uma localização para o número informado
+
+    Args:
+        api: Instância da EvolutionAPI
+        test_number: Número de WhatsApp de destino
+
+    Returns:
+        tuple: Resultados dos três envios, na ordem
     """
-    # Carregar variáveis de ambiente
-    load_dotenv()
-    
-    # Inicializar a API
-    api = EvolutionAPI()
-    
-    # Número de teste
-    test_number = "5524999887888"
-    
     print(f"\n=== Teste de envio de mensagens para {test_number} ===\n")
-    
+
     # Teste 1: Mensagem de texto simples
     print("1. Enviando mensagem de texto simples...")
     result1 = api.send_text_message(
         number=test_number,
         text="Teste de mensagem simples da Evolution API. Hora: " + time.strftime("%H:%M:%S")
     )
-    
+
     if result1.get("status") == "error":
         print(f"❌ ERRO: {result1.get('message')}")
     else:
         print("✅ Mensagem de texto enviada com sucesso!")
-    
+
     # Aguardar 2 segundos
     time.sleep(2)
-    
+
     # Teste 2: Mensagem com mídia
     print("\n2. Enviando mensagem com imagem...")
     result2 = api.send_media_message(
@@ -40,15 +53,15 @@ def test_send_messages():
         media="https://picsum.photos/300/200",
         caption="Esta é uma imagem de teste enviada pela Evolution API. Hora: " + time.strftime("%H:%M:%S")
     )
-    
-    if result2.get("status") == "error":
-        print(f"❌ ERRO: {result2.get('message')}")
+
+    if result2 is None or result2.get("status") == "error":
+        print(f"❌ ERRO: {result2.get('message') if result2 else 'A API retornou None'}")
     else:
         print("✅ Mensagem com imagem enviada com sucesso!")
-    
+
     # Aguardar 2 segundos
     time.sleep(2)
-    
+
     # Teste 3: Mensagem de localização
     print("\n3. Enviando mensagem de localização...")
     result3 = api.send_location_message(
@@ -57,15 +70,58 @@ def test_send_messages():
         longitude="-43.1729",
         address="Cristo Redentor, Rio de Janeiro, Brasil"
     )
-    
+
     if result3 is None:
         print("❌ ERRO: A API retornou None. Provavelmente o endpoint não está disponível.")
     elif result3.get("status") == "error":
         print(f"❌ ERRO: {result3.get('message')}")
     else:
         print("✅ Mensagem de localização enviada com sucesso!")
-    
+
     print("\n=== Teste concluído ===")
+    return result1, result2, result3
+
+@responses.activate
+def test_send_messages():
+    """
+    Teste específico para enviar mensagens para o número 5524999887888
+
+    As chamadas HTTP são mockadas e as pausas entre os envios são suprimidas.
+    """
+    base_url = f"https://{_TEST_SETTINGS.EVO_SUBDOMAIN}/message"
+    endpoints = ["sendText", "sendMedia", "sendLocation"]
+    for endpoint in endpoints:
+        responses.post(f"{base_url}/{endpoint}/{_TEST_SETTINGS.EVO_INSTANCE}", json={"status": "success"})
+
+    with EvolutionAPI(settings=_TEST_SETTINGS) as api, patch("test_specific_number.time.sleep") as mock_sleep:
+        results = send_messages(api)
+
+    # Os três envios foram bem-sucedidos, na ordem esperada
+    assert results == ({"status": "success"},) * 3
+    assert [call.request.url for call in responses.calls] == [
+        f"{base_url}/{endpoint}/{_TEST_SETTINGS.EVO_INSTANCE}" for endpoint in endpoints
+    ]
+
+    # As pausas entre os envios continuam previstas, mas não esperam de verdade
+    assert mock_sleep.call_count == 2
+
+@pytest.mark.network
+def test_send_messages_live():
+    """
+    Envia as mensagens de verdade para o número de teste, com as credenciais do .env
+
+    Só é executado com --run-network.
+    """
+    load_dotenv()
+    with EvolutionAPI() as api:
+        assert api.is_configured, "Configure EVO_SUBDOMAIN, EVO_INSTANCE e EVO_TOKEN no .env"
+        results = send_messages(api)
+
+    for result in results:
+        assert result is not None and result.get("status") != "error"
 
 if __name__ == "__main__":
-    test_send_messages() 
\ No newline at end of file
+    # Execução manual: envia as mensagens de verdade, com as credenciais do .env
+    load_dotenv()
+    with EvolutionAPI() as api:
+        send_messages(api)